@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'dashboard',
     'accounts',
@@ -152,6 +153,32 @@ LOGOUT_REDIRECT_URL = '/login/'
 #   entrypoint.sh                     (Docker)
 # The geoip/ directory is gitignored; never commit the .mmdb file.
 GEOIP_PATH = BASE_DIR / "geoip" / "dbip-city-lite.mmdb"
+# Path to the DB-IP Lite ASN database, downloaded by download_geoip next to the city one.
+GEOIP_ASN_PATH = BASE_DIR / "geoip" / "dbip-asn-lite.mmdb"
+# processors.geoip keeps this many lookup results per database per process (least recently used go first)
+GEOIP_CACHE_SIZE = int(os.environ.get("GEOIP_CACHE_SIZE", "200000"))
+
+# dedup() switches to a disk-spilling mode above this many records, so very large
+# feeds never need one in-memory dict keyed by every indicator. only that dict is
+# bounded: the parsed batch is still a list in memory. 0 turns it off.
+DEDUP_SPILL_THRESHOLD = int(os.environ.get("DEDUP_SPILL_THRESHOLD", "5000000"))
+DEDUP_SPILL_PARTITIONS = int(os.environ.get("DEDUP_SPILL_PARTITIONS", "64"))
+
+# How upsert_indicators() writes rows:
+#   "values"  multi-row INSERT ... ON CONFLICT statements, 1000 rows each
+#   "copy"    COPY into a temp staging table, then one set-based merge (fastest on big feeds)
+#   "pipeline" prepared fixed-shape statements streamed without waiting on each round trip
+#              (best when the database is across a network hop)
+INGEST_LOADER = os.environ.get("INGEST_LOADER", "values")
+# Save each feed over this many database connections at once (records are split by key).
+INGEST_UPSERT_WORKERS = int(os.environ.get("INGEST_UPSERT_WORKERS", "1"))
+# How ingest_all enriches new IP indicators:
+#   "inline" run the enrichers right after each feed is saved
+#   "queue"  put them on enrichment_queue and NOTIFY; run `python manage.py enrich_worker`
+#            (one or more) to enrich them off the ingest path
+ENRICH_MODE = os.environ.get("ENRICH_MODE", "inline")
+# Enrichers run on saved indicators (see processors.enrichment.ENRICHER_TYPES), comma-separated.
+ENRICHERS = [name.strip() for name in os.environ.get("ENRICHERS", "geo,asn").split(",") if name.strip()]
 
 # Logging Configuration
 # https://docs.djangoproject.com/en/5.2/topics/logging/
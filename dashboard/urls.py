@@ -40,6 +40,12 @@ urlpatterns = [
         name="dashboard-analytics"
     ),
 
+    path(
+        "analytics/heatmap/",
+        views.geo_heatmap_data,
+        name="dashboard-geo-heatmap"
+    ),
+
     path(
         "settings/",
         views.settings,
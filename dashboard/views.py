@@ -3,17 +3,21 @@ from django.shortcuts import render, redirect
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.db.models import Q, Count, Max, F
+from django.db.models.functions import Left, TruncDate
 from django.views.decorators.http import require_POST
+from django.contrib.postgres.expressions import ArraySubquery
 from django.http import JsonResponse
 from django.core.management import call_command
 from django.db import connection
 from urllib.parse import urlencode
 from datetime import timedelta
-from ingestion.models import FeedSource, IndicatorOfCompromise, GeoEnrichment, ThreatArticle
+from ingestion.labels import label_names
+from ingestion.models import FeedSource, IndicatorOfCompromise, IndicatorSource, GeoCountryCount, GeoHashCount, IndicatorSighting, Label, ThreatArticle
+from processors.record import HASH_LENGTHS, ioc_inet, ioc_key
+from processors import geohash
+from dashboard.countries import ISO2_TO_ISO3
 import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
-import pycountry
+import math
 
 # ======================================================
 # DASHBOARD HOME VIEW
@@ -67,7 +71,7 @@ def home(request):
         ).order_by("-published_at")[:2]
         # Pull the IOC's labels for context
         ioc = IndicatorOfCompromise.objects.filter(
-            ioc_type="cve", ioc_value=cve_id.lower()
+            ioc_type="cve", ioc_key=ioc_key("cve", cve_id.lower())
         ).first()
         labels = []
         if ioc and isinstance(ioc.labels, list):
@@ -100,18 +104,92 @@ def home(request):
 # Search + filtering + pagination
 # ======================================================
 
+SPARKLINE_DAYS   = 30
+SPARKLINE_WIDTH  = 90
+SPARKLINE_HEIGHT = 20
+
+
+def _sparkline_points(series):
+    # SVG polyline points for a list of daily counts, scaled to the sparkline box
+    peak = max(series)
+    step = SPARKLINE_WIDTH / (len(series) - 1)
+    return " ".join(
+        f"{i * step:.1f},{SPARKLINE_HEIGHT - 1 - (v / peak) * (SPARKLINE_HEIGHT - 2):.1f}"
+        for i, v in enumerate(series)
+    )
+
+
+def _attach_sparklines(rows):
+    # daily sighting counts for the last 30 days, one grouped query for the whole page.
+    # sets row.sparkline (polyline points, or None without sightings) and row.sighting_total
+    rows = list(rows)
+    if not rows:
+        return
+    today = timezone.localdate()
+    days = [today - timedelta(days=n) for n in range(SPARKLINE_DAYS - 1, -1, -1)]
+    daily = (
+        IndicatorSighting.objects
+        .filter(indicator_id__in=[row.id for row in rows],
+                seen_at__gte=timezone.now() - timedelta(days=SPARKLINE_DAYS))
+        .annotate(day=TruncDate("seen_at"))
+        .values_list("indicator_id", "day")
+        .annotate(count=Count("id"))
+    )
+    counts = {(indicator_id, day): count for indicator_id, day, count in daily}
+    for row in rows:
+        series = [counts.get((row.id, day), 0) for day in days]
+        row.sighting_total = sum(series)
+        row.sparkline = _sparkline_points(series) if row.sighting_total else None
+
+
+# most substring matches added to an exact hash or IP/CIDR search
+SEARCH_TEXT_MATCHES = 1000
+
+
+def _search_filter(q):
+    # an exact hash (raw digest bytes) or an address/network (IOCs whose network contains
+    # it, plus IOCs inside it) is looked up through the indexed typed columns
+    exact, typed = None, ()
+    if len(q) in HASH_LENGTHS.values():
+        try:
+            exact, typed = Q(ioc_hash=bytes.fromhex(q)), tuple(HASH_LENGTHS)
+        except ValueError:
+            pass
+    network = ioc_inet("ip", q) if exact is None else None
+    if network:
+        exact = (Q(ioc_inet__net_contains_or_equals=network) |
+                 Q(ioc_inet__net_contained_or_equal=network))
+        typed = ("ip",)
+
+    if exact is not None:
+        # ORing the index lookup with icontains would scan the whole table, so the two run
+        # as separate halves of a UNION: the indexed lookup, plus a capped substring match
+        # over the other types for URLs and domains that contain the value
+        iocs = IndicatorOfCompromise.objects
+        ids = iocs.filter(exact).values("id").union(
+            iocs.exclude(ioc_type__in=typed).filter(ioc_value__icontains=q).values("id")[:SEARCH_TEXT_MATCHES]
+        )
+        return Q(id__in=ids)
+
+    # labels are stored as ids, so match the text against the label dictionary;
+    # kept as a subquery so every matching label counts, however many there are
+    matching_labels = ArraySubquery(Label.objects.filter(name__icontains=q).values("id"))
+    return (
+        Q(ioc_value__icontains=q) |
+        Q(ioc_type__icontains=q) |
+        Q(label_ids__overlap=matching_labels)
+    )
+
+
 @login_required
 def indicators(request):
     query = IndicatorOfCompromise.objects.all()
 
-    # Search matches on value, type, or labels
+    # Search matches on value, type, or labels. A full hash or an IP/CIDR is looked
+    # up through the indexed typed columns, plus a capped substring match
     q = request.GET.get("q", "").strip()
     if q:
-        query = query.filter(
-            Q(ioc_value__icontains=q) |
-            Q(ioc_type__icontains=q) |
-            Q(labels__icontains=q)
-        )
+        query = query.filter(_search_filter(q))
 
     # Type filter
     type_filter = request.GET.get("type", "").strip()
@@ -125,8 +203,13 @@ def indicators(request):
 
     # Label filter with multiple values using AND logic (each label must be present)
     label_filters = [l.strip() for l in request.GET.getlist("label") if l.strip()]
-    for lf in label_filters:
-        query = query.filter(labels__contains=[lf])
+    if label_filters:
+        label_map = dict(Label.objects.filter(name__in=label_filters).values_list("name", "id"))
+        if len(label_map) < len(set(label_filters)):
+            # a label nobody uses can't match anything
+            query = query.none()
+        else:
+            query = query.filter(label_ids__contains=sorted(label_map.values()))
 
     # Confidence level filter (high/medium/low/none)
     conf = request.GET.get("confidence", "").strip()
@@ -159,6 +242,9 @@ def indicators(request):
 
     paginator = Paginator(query, 50)
     page_obj = paginator.get_page(request.GET.get("page"))
+    # load the label text for the whole page in one query before the rows ask for it
+    label_names({i for row in page_obj for i in row.label_ids})
+    _attach_sparklines(page_obj)
 
     # Build dropdown choices from actual data in the DB
     ioc_types = (
@@ -210,6 +296,13 @@ def indicators(request):
 def threat_feeds(request):
     sources = FeedSource.objects.all().order_by("name")
 
+    # indicator count per feed in one grouped query over the (feed_source, indicator) index
+    counts = dict(
+        IndicatorSource.objects
+        .values_list("feed_source_id")
+        .annotate(count=Count("indicator_id"))
+    )
+
     feeds = [
         {
             "id":           source.id,
@@ -218,9 +311,7 @@ def threat_feeds(request):
             "url":          source.url,
             "active":       source.is_enabled,
             "last_run":     source.last_pulled,
-            "last_count":   IndicatorOfCompromise.objects.filter(
-                                sources__contains=[source.name]
-                            ).count(),
+            "last_count":   counts.get(source.id, 0),
         }
         for source in sources
     ]
@@ -300,6 +391,57 @@ def threat_confidence_chart_data(request):
     chart_data = [{"value": item["value"], "name": item["confidence"]} for item in data]
     return JsonResponse(chart_data, safe=False)
 
+
+# most buckets one heatmap response carries, busiest first
+HEATMAP_MAX_BUCKETS = 5000
+
+
+def _float_param(request, name, default=None):
+    # default when the parameter is missing; ValueError when it isn't a finite number
+    if name not in request.GET:
+        return default
+    value = float(request.GET[name])
+    if not math.isfinite(value):
+        raise ValueError(name)
+    return value
+
+
+#heatmap data endpoint for analytics
+@login_required
+def geo_heatmap_data(request):
+    """
+    Geohash bucket counts for the city-level heatmap at ?zoom=<map zoom>, as
+    {"precision": n, "buckets": [[lat, lon, count], ...]} with each bucket at
+    its cell's centre. With ?south=&west=&north=&east= only cells inside that
+    box are returned, so a zoomed-in map gets detail for what it shows rather
+    than the busiest cells worldwide.
+    """
+    try:
+        zoom = _float_param(request, "zoom", 0.0)
+        box  = [_float_param(request, k) for k in ("south", "west", "north", "east")]
+    except ValueError:
+        return JsonResponse({"error": "zoom, south, west, north and east must be finite numbers"}, status=400)
+    if None not in box and box[0] > box[2]:
+        return JsonResponse({"error": "south must not be greater than north"}, status=400)
+
+    precision = geohash.precision_for_zoom(zoom)
+    buckets = GeoHashCount.objects.filter(precision=precision, count__gt=0)
+
+    if None not in box:
+        # the cells covering the box, a few levels coarser; a bucket is kept when its prefix is one of them
+        cells = geohash.covering(*box, precision=precision)
+        if not cells:
+            # a box entirely off the map
+            return JsonResponse({"precision": precision, "buckets": []})
+        buckets = (buckets.annotate(cell=Left("geohash", len(cells[0])))
+                          .filter(cell__in=cells))
+
+    rows = buckets.order_by("-count").values_list("geohash", "count")[:HEATMAP_MAX_BUCKETS]
+    return JsonResponse({
+        "precision": precision,
+        "buckets": [[*(round(v, 4) for v in geohash.center(cell)), count] for cell, count in rows],
+    })
+
 @login_required
 def analytics(request):
 
@@ -318,27 +460,37 @@ def analytics(request):
                            .count()
     )
 
-    #top sources by indicator count
-    with connection.cursor() as cur:
-        cur.execute("""
-            SELECT elem AS source_name, COUNT(*) AS count
-            FROM indicators_of_compromise,
-                 jsonb_array_elements_text(sources) AS elem
-            GROUP BY elem
-            ORDER BY count DESC
-            LIMIT 10
-        """)
-        top_sources = [
-            {"source_name": row[0], "count": row[1]}
-            for row in cur.fetchall()
-        ]
+    #top sources by indicator count, from the per-feed link table
+    top_sources = list(
+        IndicatorSource.objects
+        .values(source_name=F("feed_source__name"))
+        .annotate(count=Count("indicator_id"))
+        .order_by("-count")[:10]
+    )
 
     with connection.cursor() as cur:
         cur.execute(
-            "SELECT COUNT(*) FROM indicators_of_compromise WHERE jsonb_array_length(sources) > 1"
+            "SELECT COUNT(*) FROM indicators_of_compromise WHERE cardinality(sources) > 1"
         )
         multi_source_count = cur.fetchone()[0]
 
+        #top labels: count on the integer ids, then look up text for the ten winners only
+        cur.execute(
+            """
+            SELECT l.name, c.count
+            FROM (
+                SELECT label_id, COUNT(*) AS count
+                FROM indicators_of_compromise, unnest(label_ids) AS label_id
+                GROUP BY label_id
+                ORDER BY count DESC
+                LIMIT 10
+            ) c
+            JOIN labels l ON l.id = c.label_id
+            ORDER BY c.count DESC, l.name
+            """
+        )
+        top_labels = [{"label": name, "count": count} for name, count in cur.fetchall()]
+
     top_ioc_types = (
         IndicatorOfCompromise.objects
         .values("ioc_type")
@@ -346,55 +498,39 @@ def analytics(request):
         .order_by("-count")
     )
 
-    top_countries_sources = (
-        GeoEnrichment.objects
-        .values("country")
-        .annotate(count=Count("country"))
+    # per-country totals kept by triggers on geo_enrichments; see GeoCountryCount
+    top_countries_sources = list(
+        GeoCountryCount.objects
+        .filter(count__gt=0)
         .order_by("-count")
+        .values("country_code", "country", "count")
     )
-    #build the world map from country counts
-    country_rows = list(top_countries_sources)
-    country_df = pd.DataFrame(country_rows)
-    #clean country names
-    if len(country_rows) > 0:
-        country_df['country'] = country_df['country'].astype(str).str.strip()
-        country_df = country_df[country_df['country'] != '']          # drop blanks
-        country_df['count'] = pd.to_numeric(country_df['count'], errors='coerce').fillna(0).astype(int)
-
-    def name_to_iso3(name):
-        try:
-            return pycountry.countries.lookup(name).alpha_3
-        except Exception:
-            return None
+    #build the world map from country counts, skipping codes the map has no shape for
+    map_rows = [(ISO2_TO_ISO3[r["country_code"]], r) for r in top_countries_sources
+                if r["country_code"] in ISO2_TO_ISO3]
 
-    if country_df.empty:
+    if not map_rows:
         world_map_json = "{}"
     else:
-        country_df['iso3'] = country_df['country'].apply(name_to_iso3)
-        country_df = country_df.dropna(subset=['iso3'])
-
-        if country_df.empty:
-            world_map_json = "{}"
-        else:
-            country_fig = go.Figure(go.Choropleth(
-                locations=country_df['iso3'].tolist(),  # ISO-3 codes
-                z=country_df['count'].tolist(),
-                text=country_df['country'].tolist(),
-                locationmode='ISO-3',
-                colorscale='Viridis',
-                marker_line_color='white',
-                colorbar_title='Count',
-            ))
-
-            country_fig.update_layout(
-                template='plotly_dark',
-                geo=dict(projection_type='natural earth'),
-                margin=dict(t=30, b=10, l=10, r=10),
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font_color='white',
-            )
-            world_map_json = country_fig.to_json()
+        country_fig = go.Figure(go.Choropleth(
+            locations=[iso3 for iso3, _ in map_rows],  # ISO-3 codes
+            z=[r["count"] for _, r in map_rows],
+            text=[r["country"] for _, r in map_rows],
+            locationmode='ISO-3',
+            colorscale='Viridis',
+            marker_line_color='white',
+            colorbar_title='Count',
+        ))
+
+        country_fig.update_layout(
+            template='plotly_dark',
+            geo=dict(projection_type='natural earth'),
+            margin=dict(t=30, b=10, l=10, r=10),
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            font_color='white',
+        )
+        world_map_json = country_fig.to_json()
 
     #confidence donut chart
     conf_query = (
@@ -429,6 +565,7 @@ def analytics(request):
         "top_sources":          top_sources,
         "multi_source_count":   multi_source_count,
         "top_ioc_types":        top_ioc_types,
+        "top_labels":           top_labels,
         "top_countries":        top_countries_sources,
         "threat_conf_fig_json": conf_figure.to_json(),
         "world_map_json":       world_map_json,
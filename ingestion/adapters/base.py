@@ -24,7 +24,7 @@ class FeedAdapter(ABC):
             headers[auth_header] = self._api_key
         return headers
 
-    def fetch(self) -> Optional[list[dict]]:
+    def fetch(self) -> Optional[list]:
         #returns the raw items the feed gave us. returns nothing if the network call failed.
         try:
             return self.fetch_raw()
@@ -33,6 +33,7 @@ class FeedAdapter(ABC):
             return None
 
     @abstractmethod
-    def fetch_raw(self) -> list[dict]:
-        #each item needs a type, a value, labels, a confidence number, when it was first seen, and when it was last seen
+    def fetch_raw(self) -> list:
+        #each item needs a type, a value, labels, a confidence number, when it was first seen, and when it was last seen.
+        #items can be plain dicts or processors.record.IndicatorRecord; the record is much smaller for big feeds
         ...
@@ -6,6 +6,7 @@ import re
 
 from ingestion.adapters.base import FeedAdapter
 from ingestion.adapters.http import request_with_retry
+from processors.record import IndicatorRecord
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +16,7 @@ class TextFeedAdapter(FeedAdapter):
         super().__init__(api_key, since, config)
         self.source_name = self.config.get("_source_name", "text")
 
-    def fetch_raw(self) -> list[dict]:
+    def fetch_raw(self) -> list[IndicatorRecord]:
         url      = self.config["url"]
         timeout  = self.config.get("timeout", 120)
         ioc_type = self.config.get("ioc_type", "")
@@ -39,13 +40,7 @@ class TextFeedAdapter(FeedAdapter):
             line = comment_pattern.split(line)[0].strip()
             if not line:
                 continue
-            indicators.append({
-                "ioc_type":   ioc_type,
-                "ioc_value":  line,
-                "labels":     [],
-                "confidence": None,
-                "first_seen": None,
-                "last_seen":  None,
-            })
+            # blocklists run to millions of lines, so emit the compact record instead of a dict
+            indicators.append(IndicatorRecord(ioc_type=ioc_type, ioc_value=line))
 
         return indicators
@@ -0,0 +1,51 @@
+"""
+Postgres column types Django has no field for.
+"""
+
+import ipaddress
+
+from django.db import models
+from django.db.models import Lookup
+
+
+class InetField(models.Field):
+    """
+    Postgres inet: one host address or a network such as 10.0.0.0/8.
+    Unlike GenericIPAddressField it accepts networks, and it supports the
+    containment lookups below, which a GiST index with inet_ops can serve.
+    """
+
+    description = "IPv4 or IPv6 host or network"
+
+    def db_type(self, connection):
+        return "inet"
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value in (None, ""):
+            return None
+        # an interface covers both forms ("10.2.3.4" is 10.2.3.4/32) and psycopg sends it as
+        # inet; the ip address adapter GenericIPAddressField uses rejects networks
+        return ipaddress.ip_interface(str(value))
+
+
+class _InetOperator(Lookup):
+    operator = ""
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} {self.operator} {rhs}", (*lhs_params, *rhs_params)
+
+
+@InetField.register_lookup
+class NetContainsOrEquals(_InetOperator):
+    # ioc_inet__net_contains_or_equals="10.2.3.4": networks that include the address
+    lookup_name = "net_contains_or_equals"
+    operator    = ">>="
+
+
+@InetField.register_lookup
+class NetContainedOrEqual(_InetOperator):
+    # ioc_inet__net_contained_or_equal="10.0.0.0/8": addresses and networks inside it
+    lookup_name = "net_contained_or_equal"
+    operator    = "<<="
@@ -0,0 +1,63 @@
+"""
+Label dictionary: each distinct label text is stored once in the labels table
+and indicators carry an int[] of label ids (IndicatorOfCompromise.label_ids).
+
+Ids never change and labels are never deleted, so both directions are cached
+for the life of the process. Lookups only go to the database for names or ids
+this process has not seen yet, and then in one query per call.
+"""
+
+from django.db import connection, transaction
+
+_ids:   dict[str, int] = {}
+_names: dict[int, str] = {}
+
+# ORDER BY makes concurrent writers insert new names in the same order, so they can't deadlock
+INSERT_LABELS_SQL = """
+    INSERT INTO labels (name)
+    SELECT name FROM unnest(%s::text[]) AS u (name) ORDER BY name
+    ON CONFLICT (name) DO NOTHING
+"""
+
+
+def _remember(rows) -> None:
+    for label_id, name in rows:
+        _ids[name] = label_id
+        _names[label_id] = name
+
+
+def label_ids(names) -> dict[str, int]:
+    """
+    Map every name to its label id, adding names the dictionary doesn't have yet.
+    The insert and the lookup are separate statements so the lookup also sees
+    names another writer added while the insert waited on it.
+    """
+    names   = set(names)
+    missing = sorted(n for n in names if n not in _ids)
+    if not missing:
+        return {n: _ids[n] for n in names}
+
+    with connection.cursor() as cur:
+        cur.execute(INSERT_LABELS_SQL, [missing])
+        cur.execute("SELECT id, name FROM labels WHERE name = ANY(%s)", [missing])
+        rows = cur.fetchall()
+
+    found = {name: label_id for label_id, name in rows}
+    if connection.in_atomic_block:
+        # new ids only become permanent if the caller's transaction commits
+        transaction.on_commit(lambda: _remember(rows))
+    else:
+        _remember(rows)
+    return {n: _ids.get(n) or found[n] for n in names}
+
+
+def label_names(ids) -> dict[int, str]:
+    """Map label ids to their text, loading any this process hasn't cached yet."""
+    ids = set(ids)
+    missing = [i for i in ids if i not in _names]
+    if missing:
+        with connection.cursor() as cur:
+            cur.execute("SELECT id, name FROM labels WHERE id = ANY(%s)", [missing])
+            _remember(cur.fetchall())
+    return {i: _names[i] for i in ids if i in _names}
+
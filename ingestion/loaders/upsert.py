@@ -1,46 +1,194 @@
-import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from operator import itemgetter
 
-from django.db import connection
+import psycopg
+from django.conf import settings
+from django.db import connection, transaction
+from psycopg.types.json import Jsonb
 
-from ingestion.models import IndicatorOfCompromise
+from ingestion.labels import label_ids
+from ingestion.partitioning import insert_target, partition_types
+from processors.record import IndicatorRecord, ioc_hash, ioc_inet, ioc_key
 
 logger = logging.getLogger(__name__)
 
 BATCH_SIZE = 1000
 
-# the SQL below saves rows in bulk and handles duplicates.
+# the conflict rule shared by every loader mode.
 # when a row with the same type and value already exists:
 #   keep the earlier first-seen date
 #   keep the later last-seen date
 #   keep the higher confidence number
 #   combine the source names and labels from both, removing repeats
-UPSERT_SQL = """
-    INSERT INTO indicators_of_compromise
-        (ioc_type, ioc_value, confidence, labels, sources, first_seen, last_seen, ingested_at)
-    VALUES {placeholders}
-    ON CONFLICT (ioc_type, ioc_value) DO UPDATE SET
+#   (sources is text[] and label_ids int[], so the union is a plain array merge)
+# the conflict target is the 16-byte ioc_key digest rather than the full value,
+# which keeps the unique index small and its probes cheap on URL-heavy feeds
+# the WHERE clause skips the write entirely when none of that would change the row,
+# so re-ingesting the same list does not leave a dead tuple per indicator
+ON_CONFLICT_SQL = """
+    ON CONFLICT (ioc_key, ioc_type) DO UPDATE SET
         first_seen  = LEAST(indicators_of_compromise.first_seen, EXCLUDED.first_seen),
         last_seen   = GREATEST(indicators_of_compromise.last_seen, EXCLUDED.last_seen),
         confidence  = GREATEST(indicators_of_compromise.confidence, EXCLUDED.confidence),
         ingested_at = NOW(),
-        sources = COALESCE((
-            SELECT jsonb_agg(DISTINCT elem)
-            FROM jsonb_array_elements(
-                COALESCE(indicators_of_compromise.sources, '[]'::jsonb) ||
-                COALESCE(EXCLUDED.sources, '[]'::jsonb)
-            ) AS elem
-        ), '[]'::jsonb),
-        labels = COALESCE((
-            SELECT jsonb_agg(DISTINCT elem)
-            FROM jsonb_array_elements(
-                COALESCE(indicators_of_compromise.labels, '[]'::jsonb) ||
-                COALESCE(EXCLUDED.labels, '[]'::jsonb)
-            ) AS elem
-        ), '[]'::jsonb)
+        sources = ARRAY(
+            SELECT DISTINCT unnest(indicators_of_compromise.sources || EXCLUDED.sources) ORDER BY 1
+        ),
+        label_ids = ARRAY(
+            SELECT DISTINCT unnest(indicators_of_compromise.label_ids || EXCLUDED.label_ids) ORDER BY 1
+        )
+    WHERE indicators_of_compromise.first_seen IS DISTINCT FROM
+              LEAST(indicators_of_compromise.first_seen, EXCLUDED.first_seen)
+       OR indicators_of_compromise.last_seen IS DISTINCT FROM
+              GREATEST(indicators_of_compromise.last_seen, EXCLUDED.last_seen)
+       OR indicators_of_compromise.confidence IS DISTINCT FROM
+              GREATEST(indicators_of_compromise.confidence, EXCLUDED.confidence)
+       OR NOT indicators_of_compromise.sources @> EXCLUDED.sources
+       OR NOT indicators_of_compromise.label_ids @> EXCLUDED.label_ids
+"""
+
+# "values" mode: saves one group of rows per statement with a multi-row VALUES list.
+# {table} is indicators_of_compromise, or the batch's own partition once the table is
+# partitioned (see insert_target); the alias keeps the names in ON_CONFLICT_SQL valid
+UPSERT_SQL = """
+    INSERT INTO {table} AS indicators_of_compromise
+        (ioc_type, ioc_value, ioc_key, ioc_hash, ioc_inet, confidence, label_ids, sources,
+         first_seen, last_seen, ingested_at)
+    VALUES {placeholders}
+""" + ON_CONFLICT_SQL
+
+# "copy" mode: rows are streamed into a temp table with COPY, then merged in one statement.
+# ON COMMIT DROP ties the table to the surrounding transaction
+STAGING_TABLE_SQL = """
+    CREATE TEMP TABLE ioc_staging (
+        ioc_type    varchar(50),
+        ioc_value   varchar(500),
+        ioc_key     bytea,
+        ioc_hash    bytea,
+        ioc_inet    inet,
+        confidence  integer,
+        label_ids   int[],
+        sources     text[],
+        first_seen  timestamptz,
+        last_seen   timestamptz
+    ) ON COMMIT DROP
+"""
+
+STAGING_COPY_SQL = """
+    COPY ioc_staging (ioc_type, ioc_value, ioc_key, ioc_hash, ioc_inet, confidence, label_ids, sources,
+                      first_seen, last_seen)
+    FROM STDIN
+"""
+
+# set-based merge used by "copy" and "pipeline" modes. {keys} is the set of submitted
+# rows aliased as k. ORDER BY makes every run lock conflicting rows in the same order
+MERGE_SQL = """
+    INSERT INTO {table} AS indicators_of_compromise
+        (ioc_type, ioc_value, ioc_key, ioc_hash, ioc_inet, confidence, label_ids, sources,
+         first_seen, last_seen, ingested_at)
+    SELECT k.ioc_type, k.ioc_value, k.ioc_key, k.ioc_hash, k.ioc_inet, k.confidence,
+           COALESCE(k.label_ids, ARRAY[]::int[]), COALESCE(k.sources, ARRAY[]::text[]),
+           k.first_seen, k.last_seen, NOW()
+    FROM {keys}
+    ORDER BY k.ioc_type, k.ioc_key
+""" + ON_CONFLICT_SQL
+
+# "pipeline" mode: a batch arrives as ten array parameters, one per column, so the
+# statement text is the same for every batch and Postgres can keep it prepared.
+# arrays can't hold ragged arrays of arrays, so label_ids and sources travel as jsonb
+UNNEST_KEYS = """(
+        SELECT u.ioc_type, u.ioc_value, u.ioc_key, u.ioc_hash, u.ioc_inet, u.confidence,
+               ARRAY(SELECT jsonb_array_elements_text(u.label_ids)::int) AS label_ids,
+               ARRAY(SELECT jsonb_array_elements_text(u.sources)) AS sources,
+               u.first_seen, u.last_seen
+        FROM unnest(%s::varchar[], %s::varchar[], %s::bytea[], %s::bytea[], %s::inet[], %s::int[],
+                    %s::jsonb[], %s::jsonb[], %s::timestamptz[], %s::timestamptz[])
+             AS u (ioc_type, ioc_value, ioc_key, ioc_hash, ioc_inet, confidence, label_ids, sources,
+                   first_seen, last_seen)
+    ) k"""
+
+# wraps either INSERT above and counts what it did. xmax is 0 only on a freshly
+# inserted row version, so it tells inserts apart from conflict updates without
+# counting the table. conflicting rows the merge leaves alone are not returned.
+# Postgres only exposes xmax when the INSERT names a plain table or a single
+# partition, never the partitioned parent, which is why batches are split by type
+COUNTED_SQL = """
+    WITH upserted AS (
+        {insert}
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+    FROM upserted
+"""
+
+# keeps indicator_sources (one row per indicator per feed) in step with the merge above,
+# applying the same LEAST/GREATEST rules to each feed's own view of the indicator.
+# {keys} has the same shape as in CONFIRM_SQL below
+SOURCES_SQL = """
+    INSERT INTO indicator_sources (indicator_id, feed_source_id, first_seen, last_seen, confidence)
+    SELECT i.id, f.id, k.first_seen, k.last_seen, k.confidence
+    FROM {keys}
+    JOIN indicators_of_compromise i ON i.ioc_key = k.ioc_key AND i.ioc_type = k.ioc_type
+    JOIN ingestion_feedsource f ON f.name = ANY(k.sources)
+    ORDER BY i.id, f.id
+    ON CONFLICT (indicator_id, feed_source_id) DO UPDATE SET
+        first_seen = LEAST(indicator_sources.first_seen, EXCLUDED.first_seen),
+        last_seen  = GREATEST(indicator_sources.last_seen, EXCLUDED.last_seen),
+        confidence = GREATEST(indicator_sources.confidence, EXCLUDED.confidence)
+    WHERE indicator_sources.first_seen IS DISTINCT FROM
+              LEAST(indicator_sources.first_seen, EXCLUDED.first_seen)
+       OR indicator_sources.last_seen IS DISTINCT FROM
+              GREATEST(indicator_sources.last_seen, EXCLUDED.last_seen)
+       OR indicator_sources.confidence IS DISTINCT FROM
+              GREATEST(indicator_sources.confidence, EXCLUDED.confidence)
+"""
+
+# records that a skipped (unchanged) indicator was seen again. NOW() is fixed for the
+# transaction, so rows the upsert just wrote have ingested_at = NOW() and are left out;
+# for them ingested_at already is the confirmation. {keys} is the set of submitted
+# rows aliased as k: the staging table, or the batch's VALUES list in "values" mode
+CONFIRM_SQL = """
+    INSERT INTO indicator_confirmations (indicator_id, confirmed_at)
+    SELECT i.id, NOW()
+    FROM {keys}
+    JOIN indicators_of_compromise i ON i.ioc_key = k.ioc_key AND i.ioc_type = k.ioc_type
+    WHERE i.ingested_at < NOW()
+    ORDER BY i.id
+    ON CONFLICT (indicator_id) DO UPDATE SET confirmed_at = EXCLUDED.confirmed_at
 """
 
+# appends one indicator_sightings row per reporting source for every submitted row,
+# whether or not the merge changed it. a plain append: no conflict check, no rewrite
+# of the wide indicator row. {keys} has the same shape as in CONFIRM_SQL above.
+# it already resolves every submitted row to its indicator id, so it also hands back
+# (ioc_type, ioc_value, id) for the types in the last parameter; downstream stages
+# (geo enrichment) use those instead of looking the rows up again by value.
+# the merge's own RETURNING can't do this: rows it leaves unchanged aren't returned
+SIGHTINGS_SQL = """
+    WITH seen AS (
+        SELECT i.id, k.ioc_type, k.ioc_value, k.confidence, k.sources
+        FROM {keys}
+        JOIN indicators_of_compromise i ON i.ioc_key = k.ioc_key AND i.ioc_type = k.ioc_type
+    ), appended AS (
+        INSERT INTO indicator_sightings (indicator_id, source, seen_at, confidence)
+        SELECT seen.id, s.source, NOW(), seen.confidence
+        FROM seen
+        CROSS JOIN unnest(seen.sources) AS s (source)
+    )
+    SELECT ioc_type, ioc_value, id FROM seen WHERE ioc_type = ANY(%s::varchar[])
+"""
+
+LOADER_MODES = ("values", "copy", "pipeline")
+
+# rows per statement in "pipeline" mode; the statement shape doesn't depend on it
+PIPELINE_BATCH_SIZE = 5000
+
+# column order of the tuples _build_row() returns
+ROW_COLUMNS = ("ioc_type, ioc_value, ioc_key, ioc_hash, ioc_inet, confidence, label_ids, sources, "
+               "first_seen, last_seen")
+
 
 def _ensure_aware(value) -> datetime | None:
     """Make sure a date has timezone info attached before saving it to the database."""
@@ -75,57 +223,293 @@ def _truncate_labels(value) -> list:
     return [str(l)[:MAX_LABEL_LEN] for l in value if l]
 
 
-def _upsert_batch(rows: list[tuple]) -> None:
-    """Save one group of rows to the database in a single query."""
+# (ioc_type, ioc_key); any fixed order works, every writer just has to use the same one
+_ROW_KEY = itemgetter(0, 2)
+
+
+def _label_map(records) -> dict[str, int]:
+    """Label id for every label in records, resolved in bulk (see ingestion.labels)."""
+    return label_ids({l for r in records for l in _truncate_labels(r.get("labels"))})
+
+
+def _build_row(r, source_name: str, labels: dict[str, int]) -> tuple:
+    """Turn one normalized record into the column tuple every loader mode writes.
+    labels maps label text to id, as returned by _label_map()."""
+    #tuple order has to match the column lists in UPSERT_SQL and STAGING_COPY_SQL — don't reorder
+    return (
+        r["ioc_type"],
+        r["ioc_value"],
+        ioc_key(r["ioc_type"], r["ioc_value"]),
+        #typed side columns; None unless the type is a hash or an ip
+        ioc_hash(r["ioc_type"], r["ioc_value"]),
+        ioc_inet(r["ioc_type"], r["ioc_value"]),
+        _clean_conf(r.get("confidence")),
+        #label_ids (int[]) and sources (text[]); psycopg sends Python lists as arrays
+        sorted({labels[l] for l in _truncate_labels(r.get("labels"))}),
+        #wrap source in a list so the array-merge in ON_CONFLICT_SQL can union them
+        list(r.get("sources") or ([source_name] if source_name else [])),
+        #Postgres rejects naive datetimes; _ensure_aware tags missing tz as UTC
+        _ensure_aware(r.get("first_seen")),
+        _ensure_aware(r.get("last_seen")),
+    )
+
+
+def _upsert_batch(rows: list[tuple], table: str, id_types: list[str]) -> tuple[int, int, list]:
+    """Save one group of rows to the database in a single query.
+    Returns (inserted, updated, [(ioc_type, ioc_value, id), ...] for id_types) for the group."""
+    #VALUES rows are applied in order, so sorting by key makes every writer take
+    #row locks in the same order and concurrent writers can't deadlock
+    rows.sort(key=_ROW_KEY)
     placeholders = ", ".join(
-        ["(%s, %s, %s, COALESCE(%s::jsonb, '[]'::jsonb), COALESCE(%s::jsonb, '[]'::jsonb), %s, %s, NOW())"] * len(rows)
+        ["(%s, %s, %s, %s, %s::inet, %s, %s::int[], %s::text[], %s, %s, NOW())"] * len(rows)
     )
     #lay out every row's values in one long list so the query can fill its blanks in order
     params = [val for row in rows for val in row]
-    with connection.cursor() as cur:
-        cur.execute(UPSERT_SQL.format(placeholders=placeholders), params)
+    #the same rows again as a typed VALUES list for the follow-up statements
+    keys = "(VALUES {}) AS k ({})".format(
+        ", ".join(["(%s, %s, %s::bytea, %s::bytea, %s::inet, %s::int, %s::int[], %s::text[], "
+                   "%s::timestamptz, %s::timestamptz)"] * len(rows)),
+        ROW_COLUMNS,
+    )
+    #one transaction so the confirmation below sees the same NOW() as the upsert
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(COUNTED_SQL.format(insert=UPSERT_SQL.format(table=table, placeholders=placeholders)), params)
+        inserted, updated = cur.fetchone()
+        cur.execute(SOURCES_SQL.format(keys=keys), params)
+        if inserted + updated < len(rows):
+            cur.execute(CONFIRM_SQL.format(keys=keys), params)
+        cur.execute(SIGHTINGS_SQL.format(keys=keys), params + [id_types])
+        ids = cur.fetchall()
+    return inserted, updated, ids
+
+
+def _type_batches(normalized_records, source_name: str, size: int):
+    """Yield lists of built rows, at most size long, each holding a single ioc_type.
+    Once indicators_of_compromise is partitioned by ioc_type (partition_indicators)
+    every statement then touches one partition. Labels are resolved per batch as it
+    fills, so the records are only read once (a SpilledRecords is re-read from disk
+    on every pass)."""
+    buffers: dict[str, list] = {}
 
+    def build(records):
+        labels = _label_map(records)
+        return [_build_row(r, source_name, labels) for r in records]
 
-def upsert_indicators(normalized_records: list[dict], source_name: str = "") -> int:
+    for r in normalized_records:
+        batch = buffers.setdefault(r["ioc_type"], [])
+        batch.append(r)
+        if len(batch) >= size:
+            yield build(batch)
+            buffers[r["ioc_type"]] = []
+
+    #flush whatever is left for each type
+    for batch in buffers.values():
+        if batch:
+            yield build(batch)
+
+
+def _upsert_values(normalized_records, source_name: str, types: list[str] | None,
+                   id_types: list[str]) -> tuple[int, int, list]:
+    #save rows in groups of 1000 (per type) to keep each query small
+    inserted = updated = 0
+    ids = []
+    for batch in _type_batches(normalized_records, source_name, BATCH_SIZE):
+        ins, upd, batch_ids = _upsert_batch(batch, insert_target(batch[0][0], types), id_types)
+        inserted += ins
+        updated  += upd
+        ids.extend(batch_ids)
+    return inserted, updated, ids
+
+
+def _upsert_copy(normalized_records, source_name: str, types: list[str] | None,
+                 id_types: list[str]) -> tuple[int, int, list]:
+    #stream every row into the staging table, then merge the whole set in one statement
+    #(one per ioc_type when the table is partitioned, each into its own partition).
+    #the temp table only lives as long as this transaction
+    labels = _label_map(normalized_records)
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(STAGING_TABLE_SQL)
+        with cur.copy(STAGING_COPY_SQL) as copy:
+            copy.set_types(["varchar", "varchar", "bytea", "bytea", "inet", "int4", "int4[]", "text[]",
+                            "timestamptz", "timestamptz"])
+            for r in normalized_records:
+                copy.write_row(_build_row(r, source_name, labels))
+        if types is None:
+            cur.execute(COUNTED_SQL.format(insert=MERGE_SQL.format(table="indicators_of_compromise", keys="ioc_staging k")))
+            counts = cur.fetchone()
+        else:
+            cur.execute("SELECT DISTINCT ioc_type FROM ioc_staging")
+            counts = (0, 0)
+            for (ioc_type,) in cur.fetchall():
+                merge = MERGE_SQL.format(table=insert_target(ioc_type, types),
+                                         keys="ioc_staging k WHERE k.ioc_type = %s")
+                cur.execute(COUNTED_SQL.format(insert=merge), [ioc_type])
+                ins, upd = cur.fetchone()
+                counts = (counts[0] + ins, counts[1] + upd)
+        cur.execute(SOURCES_SQL.format(keys="ioc_staging k"))
+        cur.execute(CONFIRM_SQL.format(keys="ioc_staging k"))
+        cur.execute(SIGHTINGS_SQL.format(keys="ioc_staging k"), [id_types])
+        ids = cur.fetchall()
+        #drop it now too, in case we are nested inside a caller's transaction
+        cur.execute("DROP TABLE ioc_staging")
+    return counts[0], counts[1], ids
+
+
+def _pipeline_params(rows: list[tuple]) -> list[list]:
+    #transpose rows into one list per column to match the unnest() parameters in UNNEST_KEYS
+    columns = [list(col) for col in zip(*rows)]
+    columns[6] = [Jsonb(v) for v in columns[6]]
+    columns[7] = [Jsonb(v) for v in columns[7]]
+    return columns
+
+
+def _upsert_pipeline(normalized_records, source_name: str, types: list[str] | None,
+                     id_types: list[str]) -> tuple[int, int, list]:
+    #send every batch without waiting for the previous one to come back. the follow-up
+    #statements are fixed text, so each is prepared once per connection and reused.
+    #Django's own cursors bind parameters client-side, so use a plain psycopg cursor
+    #on the underlying connection for server-side binding and prepared statements.
+    #the merge is fixed text per target table, so one prepared statement per partition
+    merge_sql: dict[str, str] = {}
+    sources_sql = SOURCES_SQL.format(keys=UNNEST_KEYS)
+    confirm_sql = CONFIRM_SQL.format(keys=UNNEST_KEYS)
+    sightings_sql = SIGHTINGS_SQL.format(keys=UNNEST_KEYS)
+
+    connection.ensure_connection()
+    conn = connection.connection
+    pending: list[tuple[psycopg.Cursor, psycopg.Cursor]] = []   # (merge, sightings) per batch
+
+    def send(batch):
+        params = _pipeline_params(batch)
+        table  = insert_target(batch[0][0], types)
+        if table not in merge_sql:
+            merge_sql[table] = COUNTED_SQL.format(insert=MERGE_SQL.format(table=table, keys=UNNEST_KEYS))
+        #one transaction per batch so the confirmation sees the same NOW() as the merge
+        with conn.transaction():
+            merge = psycopg.Cursor(conn)
+            merge.execute(merge_sql[table], params, prepare=True)
+            psycopg.Cursor(conn).execute(sources_sql, params, prepare=True)
+            psycopg.Cursor(conn).execute(confirm_sql, params, prepare=True)
+            sightings = psycopg.Cursor(conn)
+            sightings.execute(sightings_sql, params + [id_types], prepare=True)
+        pending.append((merge, sightings))
+
+    #_type_batches looks up labels through Django's cursor on the same connection; that
+    #only syncs the pipeline when a batch brings labels this process hasn't cached yet
+    with conn.pipeline():
+        for batch in _type_batches(normalized_records, source_name, PIPELINE_BATCH_SIZE):
+            send(batch)
+
+    #the pipeline has been synced on exit, so every count and id is ready now
+    inserted = updated = 0
+    ids = []
+    for merge, sightings in pending:
+        ins, upd = merge.fetchone()
+        inserted += ins
+        updated  += upd
+        ids.extend(sightings.fetchall())
+    return inserted, updated, ids
+
+
+def _upsert_serial(records, source_name: str, mode: str, id_types: list[str]) -> tuple[int, int, list]:
+    #checked on every call, so a table partitioned while the scheduler is running is picked up
+    types = partition_types()
+    if mode == "copy":
+        return _upsert_copy(records, source_name, types, id_types)
+    if mode == "pipeline":
+        return _upsert_pipeline(records, source_name, types, id_types)
+    return _upsert_values(records, source_name, types, id_types)
+
+
+def _upsert_shard(records: list, source_name: str, mode: str, id_types: list[str]) -> tuple[int, int, list]:
+    #runs on a worker thread. Django gives each thread its own connection, so close
+    #it when done instead of leaving it open until the thread is collected
+    try:
+        return _upsert_serial(records, source_name, mode, id_types)
+    finally:
+        connection.close()
+
+
+def _upsert_parallel(normalized_records, source_name: str, mode: str, workers: int,
+                     id_types: list[str]) -> tuple[int, int, list]:
+    #split by a hash of the key so no two connections ever touch the same row;
+    #totals then match a serial run exactly
+    shards: list[list] = [[] for _ in range(workers)]
+    for r in normalized_records:
+        shards[hash((r["ioc_type"], r["ioc_value"])) % workers].append(r)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upsert") as pool:
+        futures = [pool.submit(_upsert_shard, shard, source_name, mode, id_types) for shard in shards if shard]
+        #wait for every shard before raising so no thread is left writing in the background
+        outcomes = [f.exception() or f.result() for f in futures]
+
+    inserted = updated = 0
+    ids = []
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+        inserted += outcome[0]
+        updated  += outcome[1]
+        ids.extend(outcome[2])
+    return inserted, updated, ids
+
+
+def upsert_indicators(normalized_records: list[IndicatorRecord], source_name: str = "",
+                      mode: str | None = None, workers: int | None = None,
+                      ids_for: tuple[str, ...] = ()) -> dict:
     """
     Save indicators to the database in bulk. When a row with the same type and
     value already exists, keep the earlier first-seen date, the later last-seen
     date, the higher confidence, and combine the source names and labels from
     both sides without repeats.
+
+    Records that already carry a "sources" list (from merge_sources) keep it;
+    everything else is tagged with source_name.
+
+    Every submitted record also appends one indicator_sightings row per source,
+    so the history of re-sightings is kept even when the merge changes nothing.
+
+    mode picks how rows reach Postgres (defaults to settings.INGEST_LOADER):
+      "values"  multi-row INSERT ... ON CONFLICT statements of BATCH_SIZE rows
+      "copy"    COPY into a temp staging table, then one INSERT ... SELECT merge
+      "pipeline" fixed-shape unnest() statements, prepared once and sent back to
+                 back in psycopg pipeline mode (best when the database is remote)
+
+    workers (defaults to settings.INGEST_UPSERT_WORKERS) above 1 hash-partitions
+    the records by key and saves the partitions concurrently, each on its own
+    connection and in its own transactions, so don't call it that way from
+    inside a transaction you expect to roll back.
+
+    Returns exact counts for this call:
+      inserted   brand-new rows
+      updated    existing rows the merge rewrote
+      unchanged  submitted rows that matched an existing row and were not rewritten;
+                 these get their indicator_confirmations.confirmed_at bumped instead
+    and under "ids" a {(ioc_type, ioc_value): id} map of every submitted record whose
+    type is in ids_for (e.g. ("ip",) for geo enrichment), new or not. It comes back
+    with the sightings insert, so it costs no extra query; it is empty by default.
     """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "ids": {}}
     if not normalized_records:
-        return 0
+        return counts
 
-    # count the table before saving so we can tell how many rows were brand new
-    before = IndicatorOfCompromise.objects.count()
+    mode = mode or getattr(settings, "INGEST_LOADER", "values")
+    if mode not in LOADER_MODES:
+        raise ValueError(f"unknown loader mode {mode!r}, expected one of {LOADER_MODES}")
 
-    #collect rows; save them to the database in groups of 1000 to keep each query small
-    batch: list[tuple] = []
-    for r in normalized_records:
-        #tuple order has to match the placeholders in UPSERT_SQL — don't reorder
-        batch.append((
-            r["ioc_type"],
-            r["ioc_value"],
-            _clean_conf(r.get("confidence")),
-            #labels and sources are jsonb columns, so serialize the lists to JSON text
-            json.dumps(_truncate_labels(r.get("labels"))),
-            #wrap source in a list so the array-merge in UPSERT_SQL can union them
-            json.dumps([source_name] if source_name else []),
-            #Postgres rejects naive datetimes; _ensure_aware tags missing tz as UTC
-            _ensure_aware(r.get("first_seen")),
-            _ensure_aware(r.get("last_seen")),
-        ))
-        if len(batch) >= BATCH_SIZE:
-            _upsert_batch(batch)
-            batch.clear()
-
-    #save any leftover rows that did not fill a full group of 1000
-    if batch:
-        _upsert_batch(batch)
-
-    after = IndicatorOfCompromise.objects.count()
-    created = after - before
-
-    logger.info("upsert: %d records -> %d new (source: %s)",
-                len(normalized_records), created, source_name or "unknown")
-    return created
+    workers = workers or getattr(settings, "INGEST_UPSERT_WORKERS", 1)
+    id_types = list(ids_for)
+    if workers > 1:
+        inserted, updated, ids = _upsert_parallel(normalized_records, source_name, mode, workers, id_types)
+    else:
+        inserted, updated, ids = _upsert_serial(normalized_records, source_name, mode, id_types)
+
+    counts["inserted"]  = inserted
+    counts["updated"]   = updated
+    counts["unchanged"] = len(normalized_records) - inserted - updated
+    counts["ids"]       = {(ioc_type, ioc_value): ioc_id for ioc_type, ioc_value, ioc_id in ids}
+
+    logger.info("upsert (%s x%d): %d records -> %d new, %d updated, %d unchanged (source: %s)",
+                mode, max(workers, 1), len(normalized_records), inserted, updated, counts["unchanged"],
+                source_name or "unknown")
+    return counts
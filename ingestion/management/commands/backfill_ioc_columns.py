@@ -0,0 +1,77 @@
+"""
+Recompute the derived columns on indicators_of_compromise for existing rows:
+ioc_key, ioc_hash and ioc_inet (see processors.record).
+
+The loader and IndicatorOfCompromise.save() fill these in on every write, and
+migration 0017 fills them for rows that predate them, so this is only needed
+for rows written some other way: a queryset .update() of ioc_type/ioc_value,
+raw SQL, or a restore from an older dump.
+Rows are processed in id ranges, each range in its own short transaction, so
+the command can run next to ingestion and be stopped and restarted at any point.
+
+Usage:
+    python manage.py backfill_ioc_columns
+    python manage.py backfill_ioc_columns --batch-size 50000
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from processors.record import ioc_hash, ioc_inet, ioc_key
+
+logger = logging.getLogger(__name__)
+
+# the next id range: the batch_size rows after the last id done
+NEXT_RANGE_SQL = """
+    SELECT id, ioc_type, ioc_value
+    FROM indicators_of_compromise
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+"""
+
+# only rows whose stored values differ are rewritten, so a second run writes nothing
+BACKFILL_SQL = """
+    UPDATE indicators_of_compromise i
+    SET ioc_key = u.ioc_key, ioc_hash = u.ioc_hash, ioc_inet = u.ioc_inet
+    FROM unnest(%s::bigint[], %s::bytea[], %s::bytea[], %s::inet[]) AS u (id, ioc_key, ioc_hash, ioc_inet)
+    WHERE i.id = u.id
+      AND (i.ioc_key IS DISTINCT FROM u.ioc_key
+           OR i.ioc_hash IS DISTINCT FROM u.ioc_hash
+           OR i.ioc_inet IS DISTINCT FROM u.ioc_inet)
+"""
+
+
+class Command(BaseCommand):
+    help = "Recompute ioc_key, ioc_hash and ioc_inet where they are missing or stale."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=10000,
+            help="Rows per id range; each range is updated in its own transaction.",
+        )
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+
+        fixed = 0
+        last_id = 0
+        while True:
+            with connection.cursor() as cur:
+                cur.execute(NEXT_RANGE_SQL, [last_id, batch_size])
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                cur.execute(BACKFILL_SQL, [
+                    [r[0] for r in rows],
+                    [ioc_key(r[1], r[2]) for r in rows],
+                    [ioc_hash(r[1], r[2]) for r in rows],
+                    [ioc_inet(r[1], r[2]) for r in rows],
+                ])
+                fixed += cur.rowcount
+            last_id = rows[-1][0]
+            logger.info(f"backfill_ioc_columns: ids up to {last_id:,} done, {fixed:,} rows fixed")
+
+        logger.info(f"Backfilled derived columns on {fixed:,} indicators.")
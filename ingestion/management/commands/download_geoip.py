@@ -1,26 +1,53 @@
 import datetime
 import gzip
+import os
 import shutil
 import urllib.request
 from pathlib import Path
 
-from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from processors.enrichment import enabled_enrichers
+
+# settings attribute holding a database's path -> the DB-IP Lite edition to fetch for it
+EDITIONS = {
+    "GEOIP_PATH":     "dbip-city-lite",
+    "GEOIP_ASN_PATH": "dbip-asn-lite",
+}
+
 
 class Command(BaseCommand):
-    help = "Download the DB-IP Lite city database if not already present."
+    help = "Download the DB-IP Lite databases the enabled enrichers read, if not already present."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--update", action="store_true",
+            help="Replace existing databases with this month's builds.",
+        )
 
     def handle(self, *args, **opts):
-        dest = Path(settings.GEOIP_PATH)
+        # only what settings.ENRICHERS turns on is downloaded and swept
+        for enricher in enabled_enrichers():
+            database = getattr(enricher, "database", None)
+            edition  = EDITIONS.get(database.path_setting) if database else None
+            if edition is None or not database.path:
+                continue  # not backed by a DB-IP file, or no path configured
+            if self._download(database.path, edition, opts["update"]):
+                # the only full re-enrichment: rows enriched from the old file, or never enriched
+                self.stdout.write(f"Re-enriching IP indicators against the new {edition} database...")
+                count = enricher.sweep()
+                self.stdout.write(self.style.SUCCESS(f"Re-enriched {count:,} IP indicators ({enricher.name})."))
+
+    def _download(self, dest: Path, edition: str, update: bool) -> bool:
+        """Fetch this month's build of edition to dest. Returns True when a new file was installed."""
         dest.parent.mkdir(parents=True, exist_ok=True)
 
-        if dest.exists():
+        if dest.exists() and not update:
             self.stdout.write(f"GeoIP database already exists at {dest} — skipping download.")
-            return
+            return False
 
         year_month = datetime.date.today().strftime("%Y-%m")
-        url = f"https://download.db-ip.com/free/dbip-city-lite-{year_month}.mmdb.gz"
+        url = f"https://download.db-ip.com/free/{edition}-{year_month}.mmdb.gz"
         gz_path = dest.with_suffix(".mmdb.gz")
 
         self.stdout.write(f"Downloading DB-IP Lite from {url} ...")
@@ -30,12 +57,17 @@ class Command(BaseCommand):
                 shutil.copyfileobj(resp, f)
         except Exception as e:
             self.stderr.write(self.style.ERROR(f"Download failed: {e}"))
-            return
+            return False
 
         self.stdout.write("Extracting...")
-        with gzip.open(gz_path, "rb") as f_in, open(dest, "wb") as f_out:
+        # extract next to the destination and swap it in with one rename, so a running
+        # process with the old file memory-mapped (processors.geoip) never sees a partial file
+        tmp_path = dest.with_suffix(".mmdb.tmp")
+        with gzip.open(gz_path, "rb") as f_in, open(tmp_path, "wb") as f_out:
             shutil.copyfileobj(f_in, f_out)
+        os.replace(tmp_path, dest)
         gz_path.unlink()
 
         size_mb = round(dest.stat().st_size / 1024 / 1024, 1)
         self.stdout.write(self.style.SUCCESS(f"Done. {dest} ({size_mb} MB)"))
+        return True
@@ -0,0 +1,162 @@
+"""
+Geo-enrich IP indicators that are already in the database, e.g. ones ingested
+before the GeoIP database was downloaded.
+
+--backfill walks every ip indicator in id order through a server-side cursor,
+hands id chunks to a pool of worker threads (each with its own connection), and
+records a checkpoint after every chunk so an interrupted run picks up where it
+stopped. Chunks only look up indicators whose geo row is missing or older than
+the installed database, so re-running over finished ranges is cheap.
+
+Usage:
+    python manage.py enrich_geo                      # count IPs that need enriching
+    python manage.py enrich_geo --backfill
+    python manage.py enrich_geo --backfill --workers 8 --chunk-size 5000
+    python manage.py enrich_geo --backfill --restart # ignore the checkpoint
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from ingestion.models import IndicatorOfCompromise
+from processors import geoip
+from processors.enrich import GEO_BATCH_SIZE, GeoEnricher
+
+logger = logging.getLogger(__name__)
+
+
+def _checkpoint_path() -> Path:
+    # kept next to the database it belongs to
+    return Path(str(settings.GEOIP_PATH)).with_name("enrich_geo.checkpoint")
+
+
+def _enrich_chunk(enricher: GeoEnricher, ids: list[int]) -> int:
+    #runs on a worker thread. Django gives each thread its own connection, so close
+    #it when done instead of leaving it open until the thread is collected
+    try:
+        return enricher.enrich(ids)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Geo-enrich existing IP indicators in resumable, parallel chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill", action="store_true",
+            help="Enrich every IP indicator that needs it (without this, only count them).",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=GEO_BATCH_SIZE,
+            help="Indicator ids per chunk; each chunk is enriched and committed on its own.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4,
+            help="Chunks enriched at the same time, each over its own database connection.",
+        )
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Start from the first id instead of the last checkpoint.",
+        )
+
+    def handle(self, *args, **opts):
+        enricher  = GeoEnricher()
+        installed = geoip.city.installed_at()
+        if installed is None:
+            raise CommandError(f"{settings.GEOIP_PATH} not found — run download_geoip first")
+
+        ips = IndicatorOfCompromise.objects.filter(ioc_type="ip")
+        if not opts["backfill"]:
+            pending = ips.filter(Q(geo__isnull=True) | Q(geo__enriched_at__lt=installed)).count()
+            self.stdout.write(f"{pending:,} IP indicators need geo enrichment; run with --backfill to enrich them.")
+            return
+
+        checkpoint = _checkpoint_path()
+        start_id = 0 if opts["restart"] else self._resume_from(checkpoint, installed)
+        if start_id:
+            self.stdout.write(f"Resuming after indicator id {start_id:,}.")
+        self._backfill(enricher, ips, start_id, installed, checkpoint, opts["chunk_size"], opts["workers"])
+
+    def _resume_from(self, checkpoint: Path, installed) -> int:
+        """The last id a previous run finished, if it ran against the same database file."""
+        try:
+            state = json.loads(checkpoint.read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+        # a newer database makes every row stale again, including the ones already done
+        if state.get("installed_at") != installed.isoformat():
+            return 0
+        return int(state.get("last_id", 0))
+
+    def _save_checkpoint(self, checkpoint: Path, last_id: int, installed) -> None:
+        # written to a temp file and renamed, so an interrupted write can't leave it half-written
+        tmp = checkpoint.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"last_id": last_id, "installed_at": installed.isoformat()}))
+        os.replace(tmp, checkpoint)
+
+    def _backfill(self, enricher, ips, start_id, installed, checkpoint, chunk_size, workers):
+        remaining = ips.filter(id__gt=start_id)
+        total = remaining.count()
+        # a server-side cursor streams the ids instead of loading them all at once
+        id_stream = remaining.order_by("id").values_list("id", flat=True).iterator(chunk_size=chunk_size)
+
+        # chunks finish out of order, so the checkpoint only moves past a chunk once
+        # every chunk before it is done too
+        in_flight = {}     # future -> (sequence number, last id in the chunk, chunk size)
+        finished  = {}     # sequence number -> last id, for chunks done ahead of an earlier one
+        next_seq  = 0      # next chunk sequence number to hand out
+        done_seq  = 0      # every chunk below this one is done and checkpointed
+        seen = enriched = 0
+        started = time.monotonic()
+
+        def collect():
+            # wait for at least one chunk, then checkpoint as far as the finished chunks allow
+            nonlocal done_seq, seen, enriched
+            ready, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in ready:
+                seq, last_id, size = in_flight.pop(future)
+                enriched += future.result()
+                seen     += size
+                finished[seq] = last_id
+            advanced = None
+            while done_seq in finished:
+                advanced = finished.pop(done_seq)
+                done_seq += 1
+            if advanced is not None:
+                self._save_checkpoint(checkpoint, advanced, installed)
+                rate = seen / max(time.monotonic() - started, 1e-9)
+                logger.info(f"enrich_geo: {seen:,}/{total:,} IPs checked, {enriched:,} enriched "
+                            f"({rate:,.0f}/s), through id {advanced:,}")
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="enrich_geo") as pool:
+            chunk = []
+            for ioc_id in id_stream:
+                chunk.append(ioc_id)
+                if len(chunk) < chunk_size:
+                    continue
+                # keep a couple of chunks per worker queued, not the whole table
+                while len(in_flight) >= workers * 2:
+                    collect()
+                in_flight[pool.submit(_enrich_chunk, enricher, chunk)] = (next_seq, chunk[-1], len(chunk))
+                next_seq += 1
+                chunk = []
+            if chunk:
+                in_flight[pool.submit(_enrich_chunk, enricher, chunk)] = (next_seq, chunk[-1], len(chunk))
+            while in_flight:
+                collect()
+
+        checkpoint.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfill done: {seen:,} IP indicators checked, {enriched:,} enriched "
+            f"in {time.monotonic() - started:,.1f}s."
+        ))
@@ -0,0 +1,127 @@
+"""
+Enrich queued IP indicators off the ingest path.
+
+With ENRICH_MODE = "queue", ingest_all puts new (and stale) IP indicators on
+enrichment_queue and sends a NOTIFY instead of enriching them inline. This
+command LISTENs for that notification and works through the queue in batches,
+running every enabled enricher (processors.enrichment) over each batch.
+Each batch is claimed with FOR UPDATE SKIP LOCKED and only deleted once every
+enricher has finished it, so several workers can run side by side and a batch
+that fails goes back on the queue. After a failure the worker waits (longer
+each time it fails in a row), reconnects, and carries on.
+
+Usage:
+    python manage.py enrich_worker                  # run until stopped
+    python manage.py enrich_worker --once           # drain the queue and exit
+    python manage.py enrich_worker --batch-size 5000
+"""
+
+import logging
+import time
+
+import psycopg
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from processors.enrich import GEO_BATCH_SIZE
+from processors.enrichment import ENRICH_CHANNEL, enabled_enrichers, run_enrichers
+
+logger = logging.getLogger(__name__)
+
+# seconds to wait after a failed batch, doubled for each failure in a row up to the max
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS  = 300
+
+# takes up to N queued indicators no other worker holds, in no particular order, with
+# their types; queue rows of indicators deleted since they were queued are just dropped
+CLAIM_SQL = """
+    WITH claimed AS (
+        DELETE FROM enrichment_queue
+        WHERE indicator_id IN (
+            SELECT indicator_id FROM enrichment_queue
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING indicator_id
+    )
+    SELECT i.ioc_type, i.id
+    FROM claimed c
+    JOIN indicators_of_compromise i ON i.id = c.indicator_id
+"""
+
+
+class Command(BaseCommand):
+    help = "Enrich indicators queued by ingest_all (ENRICH_MODE=queue), woken by NOTIFY."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=GEO_BATCH_SIZE,
+            help="Indicators claimed and enriched per transaction.",
+        )
+        parser.add_argument(
+            "--poll", type=float, default=60.0,
+            help="Seconds to wait for a notification before checking the queue anyway.",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Drain the queue once and exit instead of listening.",
+        )
+
+    def handle(self, *args, **opts):
+        # only the enrichers settings.ENRICHERS turns on need their databases
+        if not any(e.ready() for e in enabled_enrichers()):
+            raise CommandError("no enabled enricher is ready — check ENRICHERS and run download_geoip")
+
+        listening = False
+        failures  = 0
+        try:
+            while True:
+                try:
+                    if not listening:
+                        # LISTEN before draining, so nothing queued in between is missed
+                        with connection.cursor() as cur:
+                            cur.execute(f"LISTEN {ENRICH_CHANNEL}")
+                        listening = True
+                    count = self._drain(opts["batch_size"])
+                    failures = 0
+                    if count:
+                        logger.info(f"enrich_worker: {count:,} enrichment rows written")
+                    if opts["once"]:
+                        return
+                    # sleep until ingest_all notifies; the timeout covers a notification
+                    # sent while this connection was down
+                    for _ in connection.connection.notifies(timeout=opts["poll"], stop_after=1):
+                        pass
+                except (CommandError, DatabaseError, psycopg.Error) as e:
+                    if opts["once"]:
+                        raise
+                    # a failed batch was rolled back onto the queue; wait, then start over
+                    # on a fresh connection in case this one is what broke
+                    failures += 1
+                    delay = min(RETRY_BASE_SECONDS * 2 ** (failures - 1), RETRY_MAX_SECONDS)
+                    logger.error(f"enrich_worker: {e}; retrying in {delay}s")
+                    connection.close()
+                    listening = False
+                    time.sleep(delay)
+        except KeyboardInterrupt:
+            logger.info("enrich_worker: stopped")
+
+    def _drain(self, batch_size: int) -> int:
+        """Claim and enrich batches until the queue is empty. Returns rows written by all enrichers."""
+        count = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cur:
+                cur.execute(CLAIM_SQL, [batch_size])
+                rows = cur.fetchall()
+                if not rows:
+                    return count
+                ids_by_type: dict[str, list[int]] = {}
+                for ioc_type, ioc_id in rows:
+                    ids_by_type.setdefault(ioc_type, []).append(ioc_id)
+                # the enrichers write on their own connections; this one holds the claim
+                results = run_enrichers(ids_by_type)
+                failed  = [name for name, r in results.items() if r["error"]]
+                if failed:
+                    # rolls the claim back so the batch is retried
+                    raise CommandError(f"enrichers failed: {', '.join(failed)}")
+                count += sum(r["count"] for r in results.values())
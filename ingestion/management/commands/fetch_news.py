@@ -10,6 +10,7 @@ from django.utils import timezone
 from email.utils import parsedate_to_datetime
 
 from ingestion.models import IndicatorOfCompromise, ThreatArticle
+from processors.record import ioc_key
 
 logger = logging.getLogger(__name__)
 
@@ -116,7 +117,7 @@ class Command(BaseCommand):
 
             # Look up the indicator once so new rows get the FK set for cascade delete
             indicator = IndicatorOfCompromise.objects.filter(
-                ioc_type="cve", ioc_value=cve_id.lower()
+                ioc_type="cve", ioc_key=ioc_key("cve", cve_id.lower())
             ).first()
 
             for entry, title, link, pub_date in matched:
@@ -139,13 +140,17 @@ class Command(BaseCommand):
     def _get_top_cves(self, days, limit):
         """Return the CVEs that appear most frequently in the last N days."""
         with connection.cursor() as cur:
+            # ingested_at only moves when the row changes; a feed reporting the same CVE again
+            # is recorded in indicator_confirmations, so count the later of the two.
             # Tie-break by recency for stable ordering when CVEs share the same count
             cur.execute("""
-                SELECT UPPER(ioc_value), COUNT(*) AS cnt, MAX(ingested_at) AS recent
-                FROM indicators_of_compromise
-                WHERE ioc_type = 'cve'
-                  AND ingested_at >= NOW() - INTERVAL '%s days'
-                GROUP BY UPPER(ioc_value)
+                SELECT UPPER(i.ioc_value), COUNT(*) AS cnt,
+                       MAX(GREATEST(i.ingested_at, c.confirmed_at)) AS recent
+                FROM indicators_of_compromise i
+                LEFT JOIN indicator_confirmations c ON c.indicator_id = i.id
+                WHERE i.ioc_type = 'cve'
+                  AND GREATEST(i.ingested_at, c.confirmed_at) >= NOW() - INTERVAL '%s days'
+                GROUP BY UPPER(i.ioc_value)
                 ORDER BY cnt DESC, recent DESC
                 LIMIT %s
             """, [days, limit])
@@ -1,6 +1,7 @@
 import os
 import logging
 
+from django.conf import settings
 from django.core.cache import cache
 from django.core.management.base import BaseCommand
 from django.utils import timezone
@@ -8,16 +9,44 @@ from django.utils import timezone
 from ingestion.loaders.upsert import upsert_indicators
 from ingestion.models import FeedSource
 from ingestion.source_config import get_adapter_class
-from processors.dedup import dedup
-from processors.enrich import geo_enrich_batch
+from processors.dedup import dedup, merge_sources
+from processors.enrichment import enqueue, enriched_types, run_enrichers, summarize
 from processors.normalize import normalize_batch
+from processors.record import IndicatorRecord
 
 logger = logging.getLogger(__name__)
 
 
+def _success(name: str, counts: dict) -> dict:
+    # one ingestion_results entry; "added" is what the dashboard modal totals up
+    return {
+        "name":      name,
+        "added":     counts["inserted"],
+        "updated":   counts["updated"],
+        "unchanged": counts["unchanged"],
+        "error":     None,
+    }
+
+
+def _enrich(ioc_ids: dict) -> str:
+    # inline: run every enricher now; queue: hand the ids to enrich_worker. returns the log wording
+    if getattr(settings, "ENRICH_MODE", "inline") == "queue":
+        return f"{enqueue(ioc_ids)} queued for enrichment"
+    ids_by_type: dict[str, list[int]] = {}
+    for (ioc_type, _), ioc_id in ioc_ids.items():
+        ids_by_type.setdefault(ioc_type, []).append(ioc_id)
+    return summarize(run_enrichers(ids_by_type))
+
+
 class Command(BaseCommand):
     help = "Run all enabled feed sources from the database."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--merge-sources", action="store_true",
+            help="Merge indicators from every source in memory and write each one once per run.",
+        )
+
     def handle(self, *args, **opts):
         sources = FeedSource.objects.filter(is_enabled=True)
 
@@ -25,68 +54,88 @@ class Command(BaseCommand):
             logger.warning("No enabled feed sources found.")
             return
 
+        if opts.get("merge_sources"):
+            total, results = self._run_merged(sources)
+        else:
+            total, results = self._run_per_source(sources)
+
+        # save the results in temporary storage so the dashboard can show the breakdown per source
+        cache.set("ingestion_results", results, timeout=600)
+        logger.info(f"Done. {total} total new indicators saved.")
+
+    def _fetch(self, source, results):
+        """Fetch, normalize, and dedup one source. Returns the indicators, or None
+        when there is nothing to save (the reason is already in results)."""
+        adapter_class = get_adapter_class(source.adapter_type)
+        if not adapter_class:
+            logger.error(f"{source.name}: unknown adapter_type {source.adapter_type!r}, skipping")
+            results.append({"name": source.name, "added": 0, "error": "unknown adapter type"})
+            return None
+
+        since = source.last_pulled
+        config = dict(source.config or {})
+        config["url"]          = source.url
+        config["_source_name"] = source.name
+        if source.auth_header:
+            config.setdefault("auth_header", source.auth_header)
+        if source.username:
+            config.setdefault("username", source.username)
+        if source.password_env:
+            config.setdefault("password", os.environ.get(source.password_env, ""))
+        if source.collection_id:
+            config.setdefault("collection_id", source.collection_id)
+
+        since_display = since.isoformat() if since else "first pull"
+        logger.info(f"{source.name}: fetching since {since_display}")
+
+        # read the API key from the environment file; we never save keys in the database
+        api_key = os.environ.get(source.api_key_env, "") if source.api_key_env else ""
+        adapter = adapter_class(api_key=api_key, since=since, config=config)
+
+        # the steps run in order: fetch, clean up, remove duplicates, save, add geo info
+        raw = adapter.fetch()
+
+        if raw is None:
+            # nothing came back, so the fetch failed; do not move the cursor forward so we retry next run
+            logger.warning(f"{source.name}: fetch failed, will retry from same point")
+            results.append({"name": source.name, "added": 0, "error": "fetch failed"})
+            return None
+
+        if not raw:
+            source.last_pulled = timezone.now()
+            source.save(update_fields=["last_pulled"])
+            logger.info(f"{source.name}: no new indicators")
+            results.append({"name": source.name, "added": 0, "error": None})
+            return None
+
+        indicators = normalize_batch(raw, source.name)
+        indicators = dedup(indicators)
+        logger.info(f"{source.name}: {len(raw)} raw, {len(indicators)} after normalize+dedup")
+        return indicators
+
+    def _run_per_source(self, sources):
         total = 0
         results = []   # per-source summary; we save this in temporary storage so the dashboard can show it
         for source in sources:
-            adapter_class = get_adapter_class(source.adapter_type)
-            if not adapter_class:
-                logger.error(f"{source.name}: unknown adapter_type {source.adapter_type!r}, skipping")
-                results.append({"name": source.name, "added": 0, "error": "unknown adapter type"})
-                continue
-
-            since = source.last_pulled
-            config = dict(source.config or {})
-            config["url"]          = source.url
-            config["_source_name"] = source.name
-            if source.auth_header:
-                config.setdefault("auth_header", source.auth_header)
-            if source.username:
-                config.setdefault("username", source.username)
-            if source.password_env:
-                config.setdefault("password", os.environ.get(source.password_env, ""))
-            if source.collection_id:
-                config.setdefault("collection_id", source.collection_id)
-
-            since_display = since.isoformat() if since else "first pull"
-            logger.info(f"{source.name}: fetching since {since_display}")
-
             try:
-                # read the API key from the environment file; we never save keys in the database
-                api_key = os.environ.get(source.api_key_env, "") if source.api_key_env else ""
-                adapter = adapter_class(api_key=api_key, since=since, config=config)
-
-                # the steps run in order: fetch, clean up, remove duplicates, save, add geo info
-                raw = adapter.fetch()
-
-                if raw is None:
-                    # nothing came back, so the fetch failed; do not move the cursor forward so we retry next run
-                    logger.warning(f"{source.name}: fetch failed, will retry from same point")
-                    results.append({"name": source.name, "added": 0, "error": "fetch failed"})
+                indicators = self._fetch(source, results)
+                if indicators is None:
                     continue
 
-                if not raw:
-                    source.last_pulled = timezone.now()
-                    source.save(update_fields=["last_pulled"])
-                    logger.info(f"{source.name}: no new indicators")
-                    results.append({"name": source.name, "added": 0, "error": None})
-                    continue
-
-                indicators = normalize_batch(raw, source.name)
-                indicators = dedup(indicators)
-                count      = upsert_indicators(indicators, source_name=source.name)
-                geo_count  = geo_enrich_batch(indicators)
-                total     += count
+                counts      = upsert_indicators(indicators, source_name=source.name, ids_for=enriched_types())
+                enrich_note = _enrich(counts["ids"])
+                total      += counts["inserted"]
 
                 # move the cursor forward so the next run only pulls newer items
                 source.last_pulled = timezone.now()
                 source.save(update_fields=["last_pulled"])
 
                 logger.info(
-                    f"{source.name}: saved {count} new indicators "
-                    f"({len(raw)} raw, {len(indicators)} after normalize+dedup, "
-                    f"{geo_count} geo enriched)"
+                    f"{source.name}: saved {counts['inserted']} new indicators, "
+                    f"{counts['updated']} updated, {counts['unchanged']} unchanged "
+                    f"({enrich_note})"
                 )
-                results.append({"name": source.name, "added": count, "error": None})
+                results.append(_success(source.name, counts))
 
             except RuntimeError as e:
                 logger.warning(f"{source.name} skipped: {e}")
@@ -96,6 +145,61 @@ class Command(BaseCommand):
                 logger.exception(f"{source.name} failed")
                 results.append({"name": source.name, "added": 0, "error": str(e)[:120]})
 
-        # save the results in temporary storage so the dashboard can show the breakdown per source
-        cache.set("ingestion_results", results, timeout=600)
-        logger.info(f"Done. {total} total new indicators saved.")
+        return total, results
+
+    def _run_merged(self, sources):
+        # fetch every source first, then merge them so each indicator hits the database once
+        results = []
+        fetched = []   # (source, indicators) for every source that returned data
+        for source in sources:
+            try:
+                indicators = self._fetch(source, results)
+                if indicators is not None:
+                    fetched.append((source, indicators))
+            except RuntimeError as e:
+                logger.warning(f"{source.name} skipped: {e}")
+                results.append({"name": source.name, "added": 0, "error": str(e)[:120]})
+            except Exception as e:
+                logger.exception(f"{source.name} failed")
+                results.append({"name": source.name, "added": 0, "error": str(e)[:120]})
+
+        if not fetched:
+            return 0, results
+
+        merged = merge_sources([(source.name, indicators) for source, indicators in fetched])
+
+        # a brand-new indicator counts as "added" for the first source that reported it,
+        # the same credit it would get when sources are saved one after another, so
+        # save the merged records grouped by that first source
+        by_first_source: dict[str, list[IndicatorRecord]] = {}
+        for r in merged:
+            by_first_source.setdefault(r["sources"][0], []).append(r)
+
+        total = 0
+        try:
+            counts = {}
+            ioc_ids = {}
+            for source, _ in fetched:
+                counts[source.name] = upsert_indicators(
+                    by_first_source.get(source.name, []), source_name=source.name, ids_for=enriched_types(),
+                )
+                total += counts[source.name]["inserted"]
+                ioc_ids.update(counts[source.name]["ids"])
+            enrich_note = _enrich(ioc_ids)
+        except Exception as e:
+            # nothing moves forward, so every source retries from the same point next run
+            logger.exception("merged upsert failed")
+            for source, _ in fetched:
+                results.append({"name": source.name, "added": 0, "error": str(e)[:120]})
+            return 0, results
+
+        now = timezone.now()
+        for source, indicators in fetched:
+            source.last_pulled = now
+            source.save(update_fields=["last_pulled"])
+            logger.info(f"{source.name}: saved {counts[source.name]['inserted']} new indicators "
+                        f"({len(indicators)} submitted before merge)")
+            results.append(_success(source.name, counts[source.name]))
+
+        logger.info(f"merged run: {len(merged)} indicators written once, {enrich_note}")
+        return total, results
@@ -0,0 +1,130 @@
+"""
+Convert indicators_of_compromise to a table list-partitioned by ioc_type.
+
+Every type-filtered dashboard query, purge_stale run, vacuum and index rebuild
+then works against one type's partition instead of the whole dataset. The
+conversion runs in one transaction and holds an exclusive lock on the table
+for the whole copy, so run it while ingestion is stopped.
+
+What changes:
+    - one partition per ioc_type already in the table or in type_map.json,
+      plus a DEFAULT partition that catches any type added later
+    - the primary key becomes (id, ioc_type); Postgres requires every unique
+      index on a partitioned table to include the partition column. ids still
+      come from one sequence, so they stay unique in practice
+    - foreign keys from other tables (geo_enrichments, threat_articles, ...)
+      are dropped, since nothing can reference a partitioned table's id alone.
+      Django still cascades deletes made through the ORM itself
+
+Usage:
+    python manage.py partition_indicators --dry-run   # print the plan only
+    python manage.py partition_indicators
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from ingestion.partitioning import DEFAULT_PARTITION, TABLE, partition_name, partition_types
+from ingestion.type_map import TYPE_MAP
+
+logger = logging.getLogger(__name__)
+
+NEW_TABLE = f"{TABLE}_partitioned"
+SEQUENCE  = f"{TABLE}_id_seq"
+
+
+class Command(BaseCommand):
+    help = "Convert indicators_of_compromise to a table list-partitioned by ioc_type."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Print the statements without running them.",
+        )
+
+    def handle(self, *args, **opts):
+        if partition_types() is not None:
+            logger.info(f"{TABLE} is already partitioned, nothing to do.")
+            return
+
+        with transaction.atomic(), connection.cursor() as cur:
+            cur.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+            statements = self._plan(cur)
+
+            if opts["dry_run"]:
+                for sql in statements:
+                    self.stdout.write(sql.strip() + ";")
+                return
+
+            for sql in statements:
+                cur.execute(sql)
+
+        logger.info(f"{TABLE} is now partitioned by ioc_type ({len(partition_types())} typed partitions + default).")
+
+    def _plan(self, cur) -> list[str]:
+        # unique and primary-key constraints, recreated by name so later migrations can find them
+        cur.execute(
+            """
+            SELECT conname, contype, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype IN ('p', 'u')
+            """,
+            [TABLE],
+        )
+        constraints = cur.fetchall()
+        for name, contype, definition in constraints:
+            if contype == "u" and "ioc_type" not in definition:
+                raise CommandError(f"unique constraint {name} ({definition}) does not include ioc_type")
+
+        # plain indexes (not the ones backing the constraints above)
+        cur.execute(
+            """
+            SELECT i.indexname, i.indexdef
+            FROM pg_indexes i
+            WHERE i.tablename = %s
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+            """,
+            [TABLE],
+        )
+        indexes = cur.fetchall()
+
+        # foreign keys from other tables that have to go
+        cur.execute(
+            "SELECT conname, conrelid::regclass::text FROM pg_constraint WHERE confrelid = %s::regclass",
+            [TABLE],
+        )
+        for name, table in cur.fetchall():
+            logger.warning(f"partition_indicators: dropping foreign key {name} on {table}")
+
+        cur.execute(f"SELECT DISTINCT ioc_type FROM {TABLE}")
+        types = sorted({row[0] for row in cur.fetchall()} | set(TYPE_MAP.values()))
+
+        statements = [
+            # same columns, defaults and NOT NULLs; the identity is replaced by a plain sequence
+            f"CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS) PARTITION BY LIST (ioc_type)",
+            f"CREATE SEQUENCE {NEW_TABLE}_id_seq",
+            f"ALTER TABLE {NEW_TABLE} ALTER COLUMN id SET DEFAULT nextval('{NEW_TABLE}_id_seq')",
+            f"ALTER SEQUENCE {NEW_TABLE}_id_seq OWNED BY {NEW_TABLE}.id",
+        ]
+        for ioc_type in types:
+            literal = ioc_type.replace("'", "''")
+            statements.append(
+                f"CREATE TABLE {partition_name(ioc_type)} PARTITION OF {NEW_TABLE} FOR VALUES IN ('{literal}')"
+            )
+        statements += [
+            f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {NEW_TABLE} DEFAULT",
+            f"INSERT INTO {NEW_TABLE} SELECT * FROM {TABLE}",
+            f"SELECT setval('{NEW_TABLE}_id_seq', COALESCE((SELECT MAX(id) FROM {NEW_TABLE}), 0) + 1, false)",
+            # CASCADE drops the foreign keys pointing at the old table, not any rows
+            f"DROP TABLE {TABLE} CASCADE",
+            f"ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}",
+            f"ALTER SEQUENCE {NEW_TABLE}_id_seq RENAME TO {SEQUENCE}",
+        ]
+        for name, contype, definition in constraints:
+            if contype == "p":
+                definition = "PRIMARY KEY (id, ioc_type)"
+            statements.append(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+        statements += [indexdef for _, indexdef in indexes]
+        return statements
@@ -2,7 +2,8 @@
 Remove indicators that haven't been seen in over 6 months.
 
 Keeps the database focused on active threats. Run manually or on a schedule
-after ingestion to trim stale records.
+after ingestion to trim stale records. Sighting history older than the same
+cutoff is removed too.
 
 Usage:
     python manage.py purge_stale              # default: 180 days
@@ -17,7 +18,8 @@ from django.core.management.base import BaseCommand
 from django.db.models import Q
 from django.utils import timezone
 
-from ingestion.models import IndicatorOfCompromise
+from ingestion.models import IndicatorOfCompromise, IndicatorSighting
+from ingestion.partitioning import partition_types
 
 logger = logging.getLogger(__name__)
 
@@ -48,13 +50,37 @@ class Command(BaseCommand):
 
         count = to_delete.count()
 
+        # sighting history is trimmed by its own age (seen_at is when the run saw it).
+        # sightings have no FK, so a purged indicator's history ages out the same way
+        old_sightings = IndicatorSighting.objects.filter(seen_at__lt=cutoff)
+
         if opts["dry_run"]:
             logger.info(f"Would delete {count:,} stale indicators (last seen before {cutoff:%b %d, %Y %I:%M %p}).")
+            logger.info(f"Would delete {old_sightings.count():,} sightings recorded before then.")
             return
 
+        # a single range delete; the BRIN index on seen_at finds the old blocks
+        trimmed, _ = old_sightings.delete()
+        if trimmed:
+            logger.info(f"Removed {trimmed:,} sightings recorded before {cutoff:%b %d, %Y %I:%M %p}.")
+
         if count == 0:
             logger.info("No stale indicators to remove.")
             return
 
-        deleted, _ = to_delete.delete()
+        # delete() totals every cascaded row too (sources, confirmations, enrichments),
+        # so count just the indicators from its per-model breakdown
+        def purge(qs) -> int:
+            return qs.delete()[1].get("ingestion.IndicatorOfCompromise", 0)
+
+        types = partition_types()
+        if types is None:
+            deleted = purge(to_delete)
+        else:
+            # partitioned by ioc_type: delete one partition at a time so each
+            # statement only scans and locks that partition
+            deleted = 0
+            for ioc_type in types:
+                deleted += purge(to_delete.filter(ioc_type=ioc_type))
+            deleted += purge(to_delete.exclude(ioc_type__in=types))
         logger.info(f"Purged {deleted:,} indicators not seen since {cutoff:%b %d, %Y %I:%M %p}.")
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0005_scheduledtask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicatorConfirmation',
+            fields=[
+                ('indicator', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='confirmation', serialize=False, to='ingestion.indicatorofcompromise')),
+                ('confirmed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'indicator_confirmations',
+            },
+        ),
+        # leave free space on each page so confirmed_at updates stay HOT (no index churn)
+        migrations.RunSQL(
+            "ALTER TABLE indicator_confirmations SET (fillfactor = 50)",
+            "ALTER TABLE indicator_confirmations RESET (fillfactor)",
+        ),
+    ]
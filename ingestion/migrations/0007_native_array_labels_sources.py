@@ -0,0 +1,63 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # jsonb labels/sources -> text[] with GIN indexes. Postgres can't use a subquery in
+    # ALTER COLUMN ... USING, so the arrays are built in new columns and swapped in
+
+    dependencies = [
+        ('ingestion', '0006_indicatorconfirmation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indicatorofcompromise',
+            name='labels_array',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='indicatorofcompromise',
+            name='sources_array',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE indicators_of_compromise SET
+                labels_array  = ARRAY(SELECT jsonb_array_elements_text(COALESCE(labels, '[]'::jsonb))),
+                sources_array = ARRAY(SELECT jsonb_array_elements_text(COALESCE(sources, '[]'::jsonb)))
+            """,
+            """
+            UPDATE indicators_of_compromise SET
+                labels  = to_jsonb(labels_array),
+                sources = to_jsonb(sources_array)
+            """,
+        ),
+        migrations.RemoveField(
+            model_name='indicatorofcompromise',
+            name='labels',
+        ),
+        migrations.RemoveField(
+            model_name='indicatorofcompromise',
+            name='sources',
+        ),
+        migrations.RenameField(
+            model_name='indicatorofcompromise',
+            old_name='labels_array',
+            new_name='labels',
+        ),
+        migrations.RenameField(
+            model_name='indicatorofcompromise',
+            old_name='sources_array',
+            new_name='sources',
+        ),
+        migrations.AddIndex(
+            model_name='indicatorofcompromise',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['labels'], name='ioc_labels_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='indicatorofcompromise',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['sources'], name='ioc_sources_gin'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0007_native_array_labels_sources'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicatorSource',
+            fields=[
+                ('pk', models.CompositePrimaryKey('indicator_id', 'feed_source_id', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('first_seen', models.DateTimeField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('confidence', models.IntegerField(blank=True, null=True)),
+                ('feed_source', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='indicator_links', to='ingestion.feedsource')),
+                ('indicator', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='source_links', to='ingestion.indicatorofcompromise')),
+            ],
+            options={
+                'db_table': 'indicator_sources',
+                'indexes': [models.Index(fields=['feed_source', 'indicator'], name='ioc_src_feed_ioc_idx')],
+            },
+        ),
+        # backfill from the sources arrays. per-feed timestamps were never stored,
+        # so existing links start from the indicator's merged values
+        migrations.RunSQL(
+            """
+            INSERT INTO indicator_sources (indicator_id, feed_source_id, first_seen, last_seen, confidence)
+            SELECT i.id, f.id, i.first_seen, i.last_seen, i.confidence
+            FROM indicators_of_compromise i
+            JOIN ingestion_feedsource f ON f.name = ANY(i.sources)
+            ON CONFLICT DO NOTHING
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0008_indicatorsource'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indicatorofcompromise',
+            name='ioc_key',
+            field=models.BinaryField(editable=False, max_length=16, null=True),
+        ),
+        # same digest as processors.record.ioc_key: first 16 bytes of sha256("type:value")
+        migrations.RunSQL(
+            """
+            UPDATE indicators_of_compromise
+            SET ioc_key = substring(sha256(convert_to(ioc_type || ':' || ioc_value, 'UTF8')) FROM 1 FOR 16)
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='indicatorofcompromise',
+            name='ioc_key',
+            field=models.BinaryField(editable=False, max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='indicatorofcompromise',
+            name='ioc_value',
+            field=models.CharField(max_length=500),
+        ),
+        migrations.AlterUniqueTogether(
+            name='indicatorofcompromise',
+            unique_together={('ioc_key', 'ioc_type')},
+        ),
+    ]
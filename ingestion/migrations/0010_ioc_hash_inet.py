@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:54
+
+import django.contrib.postgres.indexes
+import ingestion.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0009_ioc_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indicatorofcompromise',
+            name='ioc_hash',
+            field=models.BinaryField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='indicatorofcompromise',
+            name='ioc_inet',
+            field=ingestion.fields.InetField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='indicatorofcompromise',
+            index=models.Index(condition=models.Q(('ioc_hash__isnull', False)), fields=['ioc_hash'], name='ioc_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='indicatorofcompromise',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('ioc_inet__isnull', False)), fields=['ioc_inet'], name='ioc_inet_gist', opclasses=['inet_ops']),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:57
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0010_ioc_hash_inet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Label',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.TextField(unique=True)),
+            ],
+            options={
+                'db_table': 'labels',
+            },
+        ),
+        migrations.AddField(
+            model_name='indicatorofcompromise',
+            name='label_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        # every distinct label text once, then each indicator's labels as sorted ids
+        migrations.RunSQL(
+            [
+                """
+                INSERT INTO labels (name)
+                SELECT DISTINCT unnest(labels) FROM indicators_of_compromise ORDER BY 1
+                ON CONFLICT (name) DO NOTHING
+                """,
+                """
+                UPDATE indicators_of_compromise i
+                SET label_ids = ARRAY(SELECT l.id FROM labels l WHERE l.name = ANY(i.labels) ORDER BY 1)
+                WHERE cardinality(i.labels) > 0
+                """,
+            ],
+            reverse_sql="""
+                UPDATE indicators_of_compromise i
+                SET labels = ARRAY(SELECT l.name FROM labels l WHERE l.id = ANY(i.label_ids) ORDER BY 1)
+                WHERE cardinality(i.label_ids) > 0
+            """,
+        ),
+        migrations.RemoveIndex(
+            model_name='indicatorofcompromise',
+            name='ioc_labels_gin',
+        ),
+        migrations.RemoveField(
+            model_name='indicatorofcompromise',
+            name='labels',
+        ),
+        migrations.AddIndex(
+            model_name='indicatorofcompromise',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['label_ids'], name='ioc_label_ids_gin'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:02
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0011_label_dictionary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicatorSighting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('seen_at', models.DateTimeField()),
+                ('confidence', models.IntegerField(blank=True, null=True)),
+                ('indicator', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='sightings', to='ingestion.indicatorofcompromise')),
+            ],
+            options={
+                'db_table': 'indicator_sightings',
+                'indexes': [django.contrib.postgres.indexes.BrinIndex(fields=['seen_at'], name='ioc_sighting_seen_brin'), models.Index(fields=['indicator', 'seen_at'], name='ioc_sighting_ioc_seen_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0012_indicatorsighting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrichmentQueue',
+            fields=[
+                ('indicator', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='ingestion.indicatorofcompromise')),
+                ('enqueued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'enrichment_queue',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:18
+
+import django.db.models.deletion
+import ingestion.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0013_enrichmentqueue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsnEnrichment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asn', models.BigIntegerField(blank=True, null=True)),
+                ('as_org', models.CharField(blank=True, default='', max_length=200)),
+                ('network', ingestion.fields.InetField(blank=True, null=True)),
+                ('enriched_at', models.DateTimeField(auto_now=True)),
+                ('indicator', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='asn', to='ingestion.indicatorofcompromise')),
+            ],
+            options={
+                'db_table': 'asn_enrichments',
+            },
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0014_asnenrichment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoCountryCount',
+            fields=[
+                ('country_code', models.CharField(max_length=4, primary_key=True, serialize=False)),
+                ('country', models.CharField(blank=True, default='', max_length=100)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'geo_country_counts',
+            },
+        ),
+        # seed the rollup from the rows already enriched
+        migrations.RunSQL(
+            """
+            INSERT INTO geo_country_counts (country_code, country, count)
+            SELECT country_code, max(country), count(*)
+            FROM geo_enrichments
+            GROUP BY country_code
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # keep it current: one statement-level trigger per operation folds the rows that
+        # statement touched into per-country deltas. an upsert from the enrichers fires
+        # INSERT for new rows and UPDATE for re-enriched ones, and purge_stale's cascade
+        # fires DELETE, so every writer is covered without any of them knowing about it.
+        # ORDER BY only orders locks within one pass: an upsert fires INSERT and then
+        # UPDATE, so two concurrent writers could take the busy countries in opposite
+        # orders across the pair and deadlock. every pass first takes a transaction-level
+        # advisory lock shared by all rollups on geo_enrichments, so writers apply their
+        # deltas one transaction at a time (they queue on US, CN, ... anyway)
+        migrations.RunSQL(
+            [
+                """
+                CREATE FUNCTION geo_country_counts_apply() RETURNS trigger
+                LANGUAGE plpgsql AS $$
+                BEGIN
+                    PERFORM pg_advisory_xact_lock(hashtext('geo_enrichments rollups'));
+                    IF TG_OP = 'INSERT' THEN
+                        INSERT INTO geo_country_counts (country_code, country, count)
+                        SELECT country_code, max(country), count(*)
+                        FROM new_rows GROUP BY country_code
+                        ORDER BY country_code
+                        ON CONFLICT (country_code) DO UPDATE
+                        SET count   = geo_country_counts.count + EXCLUDED.count,
+                            country = COALESCE(NULLIF(EXCLUDED.country, ''), geo_country_counts.country);
+                    ELSIF TG_OP = 'DELETE' THEN
+                        UPDATE geo_country_counts c
+                        SET count = c.count - d.n
+                        FROM (SELECT country_code, count(*) AS n FROM old_rows GROUP BY country_code ORDER BY country_code) d
+                        WHERE c.country_code = d.country_code;
+                    ELSE
+                        -- a re-enriched row can move between countries
+                        INSERT INTO geo_country_counts (country_code, country, count)
+                        SELECT country_code, max(country), sum(n)
+                        FROM (
+                            SELECT country_code, country, 1 AS n FROM new_rows
+                            UNION ALL
+                            SELECT country_code, '', -1 FROM old_rows
+                        ) d
+                        GROUP BY country_code
+                        HAVING sum(n) <> 0
+                        ORDER BY country_code
+                        ON CONFLICT (country_code) DO UPDATE
+                        SET count   = geo_country_counts.count + EXCLUDED.count,
+                            country = COALESCE(NULLIF(EXCLUDED.country, ''), geo_country_counts.country);
+                    END IF;
+                    RETURN NULL;
+                END
+                $$
+                """,
+                """
+                CREATE TRIGGER geo_country_counts_insert AFTER INSERT ON geo_enrichments
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION geo_country_counts_apply()
+                """,
+                """
+                CREATE TRIGGER geo_country_counts_update AFTER UPDATE ON geo_enrichments
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION geo_country_counts_apply()
+                """,
+                """
+                CREATE TRIGGER geo_country_counts_delete AFTER DELETE ON geo_enrichments
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION geo_country_counts_apply()
+                """,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER geo_country_counts_delete ON geo_enrichments",
+                "DROP TRIGGER geo_country_counts_update ON geo_enrichments",
+                "DROP TRIGGER geo_country_counts_insert ON geo_enrichments",
+                "DROP FUNCTION geo_country_counts_apply()",
+            ],
+        ),
+    ]
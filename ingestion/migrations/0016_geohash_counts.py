@@ -0,0 +1,168 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:25
+
+from django.db import migrations, models
+
+# copies of processors.geohash.GEOHASH_LENGTH and PRECISIONS as they were when this was
+# written; the triggers below are built from these, so changing the app's list later
+# needs a new migration that replaces them, not an edit here
+GEOHASH_LENGTH = 12
+PRECISIONS = (2, 3, 4, 5)
+PRECISIONS_SQL = "ARRAY[" + ", ".join(str(p) for p in PRECISIONS) + "]"
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(latitude, longitude, precision):
+    # standard geohash: bits alternate longitude, latitude, five bits per character
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            bit = longitude >= mid
+            lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            bit = latitude >= mid
+            lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+        value = value << 1 | bit
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def forward(apps, schema_editor):
+    # DB-IP places every IP in a city at the same point, so there are far fewer distinct
+    # coordinates than rows: hash each pair once and update all its rows together
+    with schema_editor.connection.cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT latitude, longitude FROM geo_enrichments
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """)
+        coords = cur.fetchall()
+        for start in range(0, len(coords), 1000):
+            chunk = coords[start:start + 1000]
+            cur.execute(
+                f"""
+                UPDATE geo_enrichments g SET geohash = v.geohash
+                FROM (VALUES {", ".join(["(%s::float8, %s::float8, %s)"] * len(chunk))}) AS v (lat, lon, geohash)
+                WHERE g.latitude = v.lat AND g.longitude = v.lon
+                """,
+                [x for lat, lon in chunk for x in (lat, lon, encode(lat, lon, GEOHASH_LENGTH))],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0015_geo_country_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geoenrichment',
+            name='geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.CreateModel(
+            name='GeoHashCount',
+            fields=[
+                ('geohash', models.CharField(max_length=12, primary_key=True, serialize=False)),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'geo_geohash_counts',
+                'indexes': [models.Index(fields=['precision'], name='geohash_count_precision_idx')],
+            },
+        ),
+        migrations.RunPython(forward, migrations.RunPython.noop),
+        # seed the buckets from the rows just hashed
+        migrations.RunSQL(
+            f"""
+            INSERT INTO geo_geohash_counts (geohash, precision, count)
+            SELECT left(geohash, p), p, count(*)
+            FROM geo_enrichments CROSS JOIN unnest({PRECISIONS_SQL}) AS p
+            WHERE geohash <> ''
+            GROUP BY 1, 2
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # same scheme as geo_country_counts (0015): each statement's rows become one
+        # +1/-1 delta per cell per precision in PRECISIONS. deletes go through the
+        # upsert too (the cells always exist by then) so every branch locks cells
+        # in geohash order, after the advisory lock 0015 takes for the same reason
+        migrations.RunSQL(
+            [
+                f"""
+                CREATE FUNCTION geo_geohash_counts_apply() RETURNS trigger
+                LANGUAGE plpgsql AS $$
+                BEGIN
+                    PERFORM pg_advisory_xact_lock(hashtext('geo_enrichments rollups'));
+                    IF TG_OP = 'INSERT' THEN
+                        INSERT INTO geo_geohash_counts (geohash, precision, count)
+                        SELECT left(geohash, p), p, count(*)
+                        FROM new_rows CROSS JOIN unnest({PRECISIONS_SQL}) AS p
+                        WHERE geohash <> ''
+                        GROUP BY 1, 2 ORDER BY 1
+                        ON CONFLICT (geohash) DO UPDATE
+                        SET count = geo_geohash_counts.count + EXCLUDED.count;
+                    ELSIF TG_OP = 'DELETE' THEN
+                        INSERT INTO geo_geohash_counts (geohash, precision, count)
+                        SELECT left(geohash, p), p, -count(*)
+                        FROM old_rows CROSS JOIN unnest({PRECISIONS_SQL}) AS p
+                        WHERE geohash <> ''
+                        GROUP BY 1, 2 ORDER BY 1
+                        ON CONFLICT (geohash) DO UPDATE
+                        SET count = geo_geohash_counts.count + EXCLUDED.count;
+                    ELSE
+                        -- re-enriched rows mostly stay put, so only cells that changed are written
+                        INSERT INTO geo_geohash_counts (geohash, precision, count)
+                        SELECT cell, p, sum(n)
+                        FROM (
+                            SELECT left(geohash, p) AS cell, p, 1 AS n
+                            FROM new_rows CROSS JOIN unnest({PRECISIONS_SQL}) AS p WHERE geohash <> ''
+                            UNION ALL
+                            SELECT left(geohash, p), p, -1
+                            FROM old_rows CROSS JOIN unnest({PRECISIONS_SQL}) AS p WHERE geohash <> ''
+                        ) d
+                        GROUP BY 1, 2
+                        HAVING sum(n) <> 0
+                        ORDER BY 1
+                        ON CONFLICT (geohash) DO UPDATE
+                        SET count = geo_geohash_counts.count + EXCLUDED.count;
+                    END IF;
+                    RETURN NULL;
+                END
+                $$
+                """,
+                """
+                CREATE TRIGGER geo_geohash_counts_insert AFTER INSERT ON geo_enrichments
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION geo_geohash_counts_apply()
+                """,
+                """
+                CREATE TRIGGER geo_geohash_counts_update AFTER UPDATE ON geo_enrichments
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION geo_geohash_counts_apply()
+                """,
+                """
+                CREATE TRIGGER geo_geohash_counts_delete AFTER DELETE ON geo_enrichments
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION geo_geohash_counts_apply()
+                """,
+            ],
+            reverse_sql=[
+                "DROP TRIGGER geo_geohash_counts_delete ON geo_enrichments",
+                "DROP TRIGGER geo_geohash_counts_update ON geo_enrichments",
+                "DROP TRIGGER geo_geohash_counts_insert ON geo_enrichments",
+                "DROP FUNCTION geo_geohash_counts_apply()",
+            ],
+        ),
+    ]
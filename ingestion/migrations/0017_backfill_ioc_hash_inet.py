@@ -0,0 +1,85 @@
+import ipaddress
+
+from django.db import migrations
+
+# 0010 added ioc_hash and ioc_inet empty; fill them for the rows that existed then.
+# The parsing is a copy of processors.record.ioc_hash/ioc_inet as they were when this
+# was written, so later changes there don't change what this migration does
+HASH_LENGTHS = {"md5": 32, "sha1": 40, "sha256": 64, "sha512": 128}
+
+BATCH_SIZE = 10000
+
+NEXT_RANGE_SQL = """
+    SELECT id, ioc_type, ioc_value
+    FROM indicators_of_compromise
+    WHERE id > %s
+      AND ((ioc_type = 'ip' AND ioc_inet IS NULL)
+           OR (ioc_type = ANY(%s) AND ioc_hash IS NULL))
+    ORDER BY id
+    LIMIT %s
+"""
+
+BACKFILL_SQL = """
+    UPDATE indicators_of_compromise i
+    SET ioc_hash = u.ioc_hash, ioc_inet = u.ioc_inet
+    FROM unnest(%s::bigint[], %s::bytea[], %s::inet[]) AS u (id, ioc_hash, ioc_inet)
+    WHERE i.id = u.id
+"""
+
+
+def _hash(ioc_type, ioc_value):
+    if len(ioc_value) != HASH_LENGTHS.get(ioc_type):
+        return None
+    try:
+        return bytes.fromhex(ioc_value)
+    except ValueError:
+        return None
+
+
+def _inet(ioc_type, ioc_value):
+    if ioc_type != "ip":
+        return None
+    value = ioc_value.strip()
+    if "%" in value:
+        address, _, rest = value.partition("%")
+        value = address + ("/" + rest.split("/", 1)[1] if "/" in rest else "")
+    if "/" in value:
+        try:
+            return str(ipaddress.ip_network(value, strict=False))
+        except ValueError:
+            value = value.split("/", 1)[0]
+    if value.count(":") == 1:
+        value = value.split(":")[0]
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
+
+def forward(apps, schema_editor):
+    # id ranges keep each UPDATE small; values that don't parse stay NULL and are
+    # skipped by the id cursor, so nothing is read twice
+    last_id = 0
+    with schema_editor.connection.cursor() as cur:
+        while True:
+            cur.execute(NEXT_RANGE_SQL, [last_id, list(HASH_LENGTHS), BATCH_SIZE])
+            rows = cur.fetchall()
+            if not rows:
+                return
+            cur.execute(BACKFILL_SQL, [
+                [r[0] for r in rows],
+                [_hash(r[1], r[2]) for r in rows],
+                [_inet(r[1], r[2]) for r in rows],
+            ])
+            last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingestion', '0016_geohash_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, migrations.RunPython.noop),
+    ]
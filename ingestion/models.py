@@ -1,5 +1,24 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex, GistIndex
 from django.db import models
 
+from ingestion.fields import InetField
+from ingestion.labels import label_names
+from processors.record import ioc_hash, ioc_inet, ioc_key
+
+
+class Label(models.Model):
+    #each distinct label text stored once; indicators keep the ids in label_ids.
+    #a plain int id so the ids fit the int[] column
+    id   = models.AutoField(primary_key=True)
+    name = models.TextField(unique=True)
+
+    class Meta:
+        db_table = "labels"
+
+    def __str__(self):
+        return self.name
+
 
 class IndicatorOfCompromise(models.Model):
     CONFIDENCE_LEVELS = [
@@ -9,21 +28,51 @@ class IndicatorOfCompromise(models.Model):
     ]
 
     ioc_type     = models.CharField(max_length=50, db_index=True)
-    ioc_value    = models.CharField(max_length=500, db_index=True)
+    ioc_value    = models.CharField(max_length=500)
+    #16-byte digest of type + value (processors.record.ioc_key); the conflict target
+    #and lookup key, so the unique index stays small however long the values get
+    ioc_key      = models.BinaryField(max_length=16, editable=False)
+    #typed copies of ioc_value: raw digest bytes for md5/sha1/sha256/sha512, and
+    #the address or network for ip indicators. NULL for every other type
+    ioc_hash     = models.BinaryField(max_length=64, null=True, editable=False)
+    ioc_inet     = InetField(null=True, editable=False)
     confidence   = models.IntegerField(null=True, blank=True)
-    labels       = models.JSONField(default=list, blank=True)
-    sources      = models.JSONField(default=list, blank=True)
+    #ids into the labels table, sorted; label_ids__contains filters use the GIN index
+    label_ids    = ArrayField(models.IntegerField(), default=list, blank=True)
+    #native text[] so sources__contains filters use the GIN index
+    sources      = ArrayField(models.TextField(), default=list, blank=True)
     first_seen   = models.DateTimeField(null=True, blank=True)
     last_seen    = models.DateTimeField(null=True, blank=True)
     ingested_at  = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "indicators_of_compromise"
-        unique_together = ("ioc_type", "ioc_value")
+        #ioc_type is in the key so it stays valid once the table is partitioned by type
+        unique_together = ("ioc_key", "ioc_type")
+        indexes = [
+            GinIndex(fields=["label_ids"], name="ioc_label_ids_gin"),
+            GinIndex(fields=["sources"], name="ioc_sources_gin"),
+            models.Index(fields=["ioc_hash"], name="ioc_hash_idx",
+                         condition=models.Q(ioc_hash__isnull=False)),
+            GistIndex(fields=["ioc_inet"], name="ioc_inet_gist", opclasses=["inet_ops"],
+                      condition=models.Q(ioc_inet__isnull=False)),
+        ]
 
     def __str__(self):
         return f"{self.ioc_type}:{self.ioc_value}"
 
+    def save(self, *args, **kwargs):
+        self.ioc_key  = ioc_key(self.ioc_type, self.ioc_value)
+        self.ioc_hash = ioc_hash(self.ioc_type, self.ioc_value)
+        self.ioc_inet = ioc_inet(self.ioc_type, self.ioc_value)
+        super().save(*args, **kwargs)
+
+    @property
+    def labels(self):
+        #label text, resolved through the process-wide label cache
+        names = label_names(self.label_ids)
+        return sorted(names[i] for i in self.label_ids if i in names)
+
     @property
     def confidence_level(self):
         if self.confidence is None:
@@ -33,6 +82,25 @@ class IndicatorOfCompromise(models.Model):
                 return display
         return "Unknown"
 
+
+class IndicatorConfirmation(models.Model):
+    #when a feed last reported an indicator without changing it. the upsert skips
+    #no-op rewrites of the wide indicator row, so the re-sighting is recorded here
+    #instead: a narrow row whose only changing column is unindexed (HOT updates)
+    indicator    = models.OneToOneField(
+        IndicatorOfCompromise,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="confirmation",
+    )
+    confirmed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "indicator_confirmations"
+
+    def __str__(self):
+        return f"{self.indicator} confirmed {self.confirmed_at:%Y-%m-%d}"
+
 class GeoEnrichment(models.Model):
     #geo location data for IP indicators
     indicator    = models.OneToOneField(
@@ -47,6 +115,8 @@ class GeoEnrichment(models.Model):
     city           = models.CharField(max_length=100, blank=True, default="")
     latitude       = models.FloatField(null=True, blank=True)
     longitude      = models.FloatField(null=True, blank=True)
+    #full-length geohash of latitude/longitude, rolled up into GeoHashCount
+    geohash        = models.CharField(max_length=12, blank=True, default="")
     enriched_at    = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -56,6 +126,60 @@ class GeoEnrichment(models.Model):
         return f"{self.indicator} in {self.country_code or '??'}"
 
 
+class GeoCountryCount(models.Model):
+    #rollup of geo_enrichments per country for the analytics map and table. kept exact by
+    #statement-level triggers on geo_enrichments (migration 0015), so enrichment upserts and
+    #purge_stale's deletes adjust the affected countries instead of anyone recounting the table
+    country_code = models.CharField(max_length=4, primary_key=True)
+    country      = models.CharField(max_length=100, blank=True, default="")
+    count        = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "geo_country_counts"
+
+    def __str__(self):
+        return f"{self.country_code or '??'}: {self.count}"
+
+
+class GeoHashCount(models.Model):
+    #geo_enrichments per geohash cell at each of processors.geohash.PRECISIONS, for the
+    #city-level heatmap. kept exact by triggers on geo_enrichments (migration 0016), the
+    #same way as GeoCountryCount
+    geohash   = models.CharField(max_length=12, primary_key=True)
+    precision = models.PositiveSmallIntegerField()
+    count     = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "geo_geohash_counts"
+        #count isn't indexed, so the triggers' increments stay HOT updates
+        indexes = [models.Index(fields=["precision"], name="geohash_count_precision_idx")]
+
+    def __str__(self):
+        return f"{self.geohash}: {self.count}"
+
+
+class AsnEnrichment(models.Model):
+    #autonomous system for IP indicators, from the local DB-IP Lite ASN database (processors.asn).
+    #no foreign key constraint, so it works against the partitioned indicators table
+    indicator = models.OneToOneField(
+        IndicatorOfCompromise,
+        on_delete=models.CASCADE,
+        related_name="asn",
+        db_constraint=False,
+    )
+    asn         = models.BigIntegerField(null=True, blank=True)
+    as_org      = models.CharField(max_length=200, blank=True, default="")
+    #the announced prefix the address falls in
+    network     = InetField(null=True, blank=True)
+    enriched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "asn_enrichments"
+
+    def __str__(self):
+        return f"{self.indicator} in AS{self.asn or '?'}"
+
+
 #feed source config, seeded by migration 0002
 class FeedSource(models.Model):
 
@@ -88,6 +212,86 @@ class FeedSource(models.Model):
         return self.name
 
 
+class IndicatorSource(models.Model):
+    #one row per feed that reported an indicator, with that feed's own view of it.
+    #kept in step with the sources array by upsert_indicators so per-feed counts and
+    #drill-downs are index scans instead of full-table array searches
+    pk          = models.CompositePrimaryKey("indicator_id", "feed_source_id")
+    indicator   = models.ForeignKey(
+        IndicatorOfCompromise,
+        on_delete=models.CASCADE,
+        related_name="source_links",
+        db_index=False,  #the primary key already leads with indicator_id
+    )
+    feed_source = models.ForeignKey(
+        FeedSource,
+        on_delete=models.CASCADE,
+        related_name="indicator_links",
+        db_index=False,  #covered by the (feed_source, indicator) index below
+    )
+    first_seen  = models.DateTimeField(null=True, blank=True)
+    last_seen   = models.DateTimeField(null=True, blank=True)
+    confidence  = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = "indicator_sources"
+        indexes = [
+            models.Index(fields=["feed_source", "indicator"], name="ioc_src_feed_ioc_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.indicator} via {self.feed_source}"
+
+
+class IndicatorSighting(models.Model):
+    #append-only history: one row each time a feed reports an indicator, written in
+    #bulk by upsert_indicators. rows are never updated, so seen_at follows insert order
+    #and a BRIN index covers time ranges at a fraction of a btree's size.
+    #no foreign key constraint, so appends skip the FK check and work against the
+    #partitioned indicators table; purge_stale trims history by seen_at instead
+    indicator  = models.ForeignKey(
+        IndicatorOfCompromise,
+        on_delete=models.DO_NOTHING,
+        related_name="sightings",
+        db_constraint=False,
+        db_index=False,  #covered by the (indicator, seen_at) index below
+    )
+    source     = models.CharField(max_length=100)
+    seen_at    = models.DateTimeField()
+    confidence = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = "indicator_sightings"
+        indexes = [
+            BrinIndex(fields=["seen_at"], name="ioc_sighting_seen_brin"),
+            models.Index(fields=["indicator", "seen_at"], name="ioc_sighting_ioc_seen_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.indicator} seen by {self.source} at {self.seen_at:%Y-%m-%d %H:%M}"
+
+
+class EnrichmentQueue(models.Model):
+    #indicators waiting for enrich_worker when settings.ENRICH_MODE is "queue".
+    #ingest_all adds rows and sends a NOTIFY; the worker claims batches with
+    #FOR UPDATE SKIP LOCKED and deletes them in the same transaction it enriches them in.
+    #one row per indicator, so enqueueing it again before the worker gets to it is a no-op
+    indicator   = models.OneToOneField(
+        IndicatorOfCompromise,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        related_name="+",
+        db_constraint=False,
+    )
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "enrichment_queue"
+
+    def __str__(self):
+        return f"indicator {self.indicator_id} queued at {self.enqueued_at:%Y-%m-%d %H:%M}"
+
+
 class ThreatArticle(models.Model):
     # News articles matched to CVEs via RSS feeds
     title         = models.CharField(max_length=300)
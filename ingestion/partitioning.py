@@ -0,0 +1,63 @@
+"""
+Helpers for the optional list-partitioned layout of indicators_of_compromise.
+
+The table starts out as one heap. `python manage.py partition_indicators`
+converts it to one partition per ioc_type (plus a DEFAULT partition for types
+nobody listed). Code that wants to work one partition at a time asks
+partition_types() which layout is live.
+"""
+
+import re
+
+from django.db import connection
+
+TABLE = "indicators_of_compromise"
+DEFAULT_PARTITION = f"{TABLE}_p_default"
+
+# pg_get_expr() renders a list partition bound as: FOR VALUES IN ('ip', 'domain')
+_BOUND_VALUE = re.compile(r"'((?:[^']|'')*)'")
+
+
+def partition_types() -> list[str] | None:
+    """
+    Return the ioc_type values that have their own partition, or None when the
+    table is not partitioned. Rows of any other type live in the DEFAULT partition.
+    """
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE]
+        )
+        if cur.fetchone() is None:
+            return None
+        cur.execute(
+            """
+            SELECT pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [TABLE],
+        )
+        types = []
+        for (bound,) in cur.fetchall():
+            if bound and bound.startswith("FOR VALUES IN"):
+                types.extend(v.replace("''", "'") for v in _BOUND_VALUE.findall(bound))
+        return sorted(types)
+
+
+def partition_name(ioc_type: str) -> str:
+    """Table name used for the partition holding one ioc_type."""
+    return f"{TABLE}_p_{re.sub(r'[^a-z0-9]+', '_', ioc_type.lower()).strip('_') or 'blank'}"
+
+
+def insert_target(ioc_type: str, types: list[str] | None) -> str:
+    """
+    Table a batch of one ioc_type should be written to, given partition_types().
+    Writing to the partition directly skips tuple routing and lets RETURNING see
+    system columns such as xmax, which a partitioned parent does not expose.
+    """
+    if types is None:
+        return TABLE
+    if ioc_type in types:
+        return partition_name(ioc_type)
+    return DEFAULT_PARTITION
@@ -0,0 +1,20 @@
+"""
+ASN enrichment for IP indicators using the local DB-IP Lite ASN database.
+Shares the memory-mapped reader and network-block cache in processors.geoip.
+"""
+
+from ingestion.models import AsnEnrichment
+from processors import geoip
+from processors.enrichment import MmdbEnricher
+
+
+class AsnEnricher(MmdbEnricher):
+    """Autonomous system number, organisation, and announced prefix for each IP
+    indicator, one AsnEnrichment row each, kept current the same way as geo."""
+
+    name          = "asn"
+    batch_size    = 1000
+    database      = geoip.asn
+    model         = AsnEnrichment
+    related_name  = "asn"
+    update_fields = ["asn", "as_org", "network", "enriched_at"]
@@ -1,35 +1,212 @@
 import logging
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+
+from django.conf import settings
+
+from processors.record import IndicatorRecord, as_record
 
 logger = logging.getLogger(__name__)
 
+# used when Django settings are not loaded (e.g. the benchmark scripts)
+DEFAULT_SPILL_THRESHOLD  = 5_000_000
+DEFAULT_SPILL_PARTITIONS = 64
+
+# records are written to the partition files in chunks of this size
+_SPILL_CHUNK = 10_000
+
+
+def _dedup_into(seen: dict, r) -> None:
+    """Fold one record into seen, keeping the newest last_seen and merging labels."""
+    key = (r.get("ioc_type", ""), r.get("ioc_value", ""))
+    existing = seen.get(key)
+    if existing is None:
+        seen[key] = r
+    else:
+        # merge labels from both records, preserving order and removing dupes
+        merged_labels = list(dict.fromkeys(
+            (existing.get("labels") or []) + (r.get("labels") or [])
+        ))
+        # keep whichever record has the more recent last_seen timestamp
+        r_ts = r.get("last_seen")
+        e_ts = existing.get("last_seen")
+        if r_ts and (e_ts is None or r_ts > e_ts):
+            seen[key] = r
+        seen[key]["labels"] = merged_labels
+
+
+def _spill_setting(name: str, default: int) -> int:
+    if not settings.configured:
+        return default
+    return getattr(settings, name, default)
 
-def dedup(records: list[dict]) -> list[dict]:
+
+def dedup(records: list[IndicatorRecord]):
     """
-    Deduplicate a batch of parsed IOC dicts by (ioc_type, ioc_value),
+    Deduplicate a batch of parsed IOC records by (ioc_type, ioc_value),
     keeping the record with the most recent last_seen.
     Labels from every duplicate are merged onto the winner so that
     context from all sightings is preserved.
+
+    Batches larger than DEDUP_SPILL_THRESHOLD are deduplicated on disk
+    and come back as a SpilledRecords, which iterates like the list.
+    That only bounds the dedup dict: the batch passed in is already a
+    list, and merge_sources and the parallel loader build lists from the
+    result again, so a run still needs memory in proportion to the feed.
     """
+    threshold = _spill_setting("DEDUP_SPILL_THRESHOLD", DEFAULT_SPILL_THRESHOLD)
+    if threshold and len(records) > threshold:
+        return dedup_external(records, _spill_setting("DEDUP_SPILL_PARTITIONS", DEFAULT_SPILL_PARTITIONS))
+
     # group records by (type, value) so duplicates collapse into one
-    seen: dict[tuple, dict] = {}
+    seen: dict[tuple, IndicatorRecord] = {}
     for r in records:
-        key = (r.get("ioc_type", ""), r.get("ioc_value", ""))
-        existing = seen.get(key)
-        if existing is None:
-            seen[key] = r
-        else:
-            # merge labels from both records, preserving order and removing dupes
-            merged_labels = list(dict.fromkeys(
-                (existing.get("labels") or []) + (r.get("labels") or [])
-            ))
-            # keep whichever record has the more recent last_seen timestamp
-            r_ts = r.get("last_seen")
-            e_ts = existing.get("last_seen")
-            if r_ts and (e_ts is None or r_ts > e_ts):
-                seen[key] = r
-            seen[key]["labels"] = merged_labels
+        _dedup_into(seen, r)
 
     before = len(records)
     result = list(seen.values())
     logger.info("dedup: %d -> %d (removed %d duplicates)", before, len(result), before - len(result))
     return result
+
+
+def _read_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk
+
+
+class SpilledRecords:
+    """
+    Deduplicated records held in temporary partition files. Can be iterated any
+    number of times (the loader and enrichment each make a pass) and reports its
+    length like a list. The files are removed by close() or when this object is
+    garbage collected.
+    """
+
+    def __init__(self, tmpdir: str, paths: list[str], count: int):
+        self._paths = paths
+        self._count = count
+        self._finalizer = weakref.finalize(self, shutil.rmtree, tmpdir, ignore_errors=True)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        for path in self._paths:
+            yield from _read_chunks(path)
+
+    def close(self) -> None:
+        self._finalizer()
+
+
+def dedup_external(records, partitions: int = DEFAULT_SPILL_PARTITIONS) -> SpilledRecords:
+    """
+    Disk-backed version of dedup() for batches too big for one in-memory dict.
+    Records are hash-partitioned by (ioc_type, ioc_value) into temporary files,
+    so every duplicate lands in the same partition; each partition is then
+    deduplicated on its own with the same rules and written back. Only one
+    partition's dict is held in memory at a time; records itself is not
+    freed, so the caller's copy of the batch is still resident.
+    """
+    tmpdir = tempfile.mkdtemp(prefix="cti-dedup-")
+    paths = [os.path.join(tmpdir, f"part{i:03d}.pkl") for i in range(partitions)]
+    try:
+        # pass 1: scatter records into partition files
+        before = 0
+        buffers: list[list] = [[] for _ in range(partitions)]
+        files = [open(p, "wb") for p in paths]
+        try:
+            for r in records:
+                before += 1
+                i = hash((r.get("ioc_type", ""), r.get("ioc_value", ""))) % partitions
+                buf = buffers[i]
+                buf.append(as_record(r))
+                if len(buf) >= _SPILL_CHUNK:
+                    pickle.dump(buf, files[i], protocol=pickle.HIGHEST_PROTOCOL)
+                    buf.clear()
+            for i, buf in enumerate(buffers):
+                if buf:
+                    pickle.dump(buf, files[i], protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for f in files:
+                f.close()
+        del buffers
+
+        # pass 2: dedup each partition in memory and overwrite it with the winners
+        after = 0
+        for path in paths:
+            seen: dict[tuple, IndicatorRecord] = {}
+            for r in _read_chunks(path):
+                _dedup_into(seen, r)
+            winners = list(seen.values())
+            del seen
+            with open(path, "wb") as f:
+                for start in range(0, len(winners), _SPILL_CHUNK):
+                    pickle.dump(winners[start:start + _SPILL_CHUNK], f, protocol=pickle.HIGHEST_PROTOCOL)
+            after += len(winners)
+    except BaseException:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+
+    logger.info("dedup (spilled to %d partitions): %d -> %d (removed %d duplicates)",
+                partitions, before, after, before - after)
+    return SpilledRecords(tmpdir, paths, after)
+
+
+def _least(a, b):
+    # LEAST() in Postgres ignores NULLs, so only fall back to None when both are missing
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def _greatest(a, b):
+    # GREATEST() in Postgres ignores NULLs the same way
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+def merge_sources(batches: list[tuple[str, list[IndicatorRecord]]]) -> list[IndicatorRecord]:
+    """
+    Merge already deduplicated batches from several sources into one list so
+    each indicator is written once per run. Uses the same rules as UPSERT_SQL:
+    earliest first_seen, latest last_seen, highest confidence, and the union of
+    labels and sources. Each merged record carries a "sources" list in the order
+    the sources were run, so sources[0] is the feed that reported it first.
+    """
+    merged: dict[tuple, IndicatorRecord] = {}
+    total = 0
+    for source_name, records in batches:
+        for r in records:
+            total += 1
+            key = (r.get("ioc_type", ""), r.get("ioc_value", ""))
+            existing = merged.get(key)
+            if existing is None:
+                # copy so the per-source batch is left untouched
+                merged[key] = as_record(r).copy()
+                merged[key].labels  = list(r.get("labels") or [])
+                merged[key].sources = [source_name]
+                continue
+            existing.first_seen = _least(existing.first_seen, r.get("first_seen"))
+            existing.last_seen  = _greatest(existing.last_seen, r.get("last_seen"))
+            existing.confidence = _greatest(existing.confidence, r.get("confidence"))
+            existing.labels = list(dict.fromkeys(existing.labels + (r.get("labels") or [])))
+            if source_name not in existing.sources:
+                existing.sources.append(source_name)
+
+    result = list(merged.values())
+    logger.info("merge_sources: %d records from %d sources -> %d indicators",
+                total, len(batches), len(result))
+    return result
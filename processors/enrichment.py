@@ -0,0 +1,300 @@
+"""
+Enrichment stages that run on indicators after they are saved.
+
+Adding an enricher means adding one entry to ENRICHER_TYPES and one class, the
+same way feeds are added through ingestion.source_config.ADAPTER_TYPES. Each
+enricher declares the ioc types it accepts and how many indicators it takes per
+call. run_enrichers() runs every enabled enricher (settings.ENRICHERS) at the
+same time over the same ids, times each one, and keeps one enricher's failure
+from stopping the others.
+"""
+
+import importlib
+import logging
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from ingestion.models import IndicatorOfCompromise
+from processors.record import ioc_inet
+
+logger = logging.getLogger(__name__)
+
+ENRICHER_TYPES = {
+    "geo": "processors.enrich.GeoEnricher",
+    "asn": "processors.asn.AsnEnricher",
+}
+
+# share of a batch's lookups that may error before MmdbEnricher treats the whole batch as failed
+MAX_FAILED_LOOKUPS = 0.1
+
+# LISTEN/NOTIFY channel enqueue() signals and enrich_worker waits on
+ENRICH_CHANNEL = "indicator_enrichment"
+
+# ORDER BY keeps concurrent ingests from deadlocking on each other's queue rows
+ENQUEUE_SQL = """
+    INSERT INTO enrichment_queue (indicator_id, enqueued_at)
+    SELECT id, NOW() FROM unnest(%s::bigint[]) AS q (id)
+    ORDER BY id
+    ON CONFLICT (indicator_id) DO NOTHING
+"""
+
+
+def get_enricher_class(name: str):
+    # looks up the enricher class for a given name, returns None if unknown
+    path = ENRICHER_TYPES.get(name)
+    if not path:
+        return None
+    module_path, class_name = path.rsplit(".", 1)
+    module = importlib.import_module(module_path)
+    return getattr(module, class_name)
+
+
+def enabled_enrichers() -> list["Enricher"]:
+    """One instance of every enricher named in settings.ENRICHERS, skipping unknown names."""
+    enrichers = []
+    for name in getattr(settings, "ENRICHERS", ["geo"]):
+        cls = get_enricher_class(name)
+        if cls is None:
+            logger.error("unknown enricher %r in ENRICHERS, skipping", name)
+            continue
+        enrichers.append(cls())
+    return enrichers
+
+
+def enriched_types() -> tuple[str, ...]:
+    """Every ioc type some enabled enricher accepts; pass it as upsert_indicators(ids_for=...)."""
+    return tuple(sorted({t for e in enabled_enrichers() for t in e.ioc_types}))
+
+
+def _batches(ids: list[int], size: int):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class Enricher(ABC):
+
+    name: str = ""
+    # ioc types this enricher accepts; ids of other types are never passed to it
+    ioc_types: tuple[str, ...] = ()
+    # most indicator ids passed to one enrich() call
+    batch_size: int = 1000
+
+    def ready(self) -> bool:
+        #False skips the enricher for this run, e.g. when its database isn't downloaded yet
+        return True
+
+    def pending(self, ioc_ids: list[int]):
+        #the indicators among ioc_ids this enricher would write, as an IndicatorOfCompromise
+        #queryset; enqueue() uses it to queue only work some enricher still has to do.
+        #ioc_ids becomes an IN list, so pass at most batch_size of them (see _batches)
+        return IndicatorOfCompromise.objects.filter(ioc_type__in=self.ioc_types, id__in=ioc_ids)
+
+    @abstractmethod
+    def enrich(self, ioc_ids: list[int]) -> int:
+        #enrich at most batch_size indicators by id and return how many rows were written.
+        #indicators that are already current should be skipped, not rewritten
+        ...
+
+    def sweep(self) -> int:
+        #re-enrich everything that is out of date; download_geoip calls it after a new build
+        return 0
+
+
+class MmdbEnricher(Enricher):
+    """
+    An enricher backed by one processors.geoip database that keeps one row per
+    indicator in model, reachable from IndicatorOfCompromise as related_name.
+    A row is current when it was written after the database file was installed.
+    """
+
+    ioc_types = ("ip",)
+    batch_size = 1000
+
+    database      = None    # a processors.geoip.MmdbDatabase
+    model         = None    # one-to-one with IndicatorOfCompromise, with an enriched_at auto_now field
+    related_name  = ""
+    update_fields: list[str] = []
+
+    def ready(self) -> bool:
+        path = self.database.path
+        if not path:
+            logger.warning("%s: %s not configured — skipping", self.name, self.database.path_setting)
+            return False
+        if not path.exists():
+            logger.warning("%s: %s not found — run download_geoip first", self.name, path)
+            return False
+        return True
+
+    def _needs(self, qs, installed):
+        # anti-join: indicators with no row, or one written before the current database was installed
+        missing = Q(**{f"{self.related_name}__isnull": True})
+        if installed is None:
+            # no database on this machine: only rows that were never written count
+            return qs.filter(missing)
+        return qs.filter(missing | Q(**{f"{self.related_name}__enriched_at__lt": installed}))
+
+    def pending(self, ioc_ids: list[int]):
+        return self._needs(super().pending(ioc_ids), self.database.installed_at())
+
+    def _write(self, indicators) -> int:
+        """
+        Look up (id, ioc_value) pairs and upsert their rows in one statement. Returns
+        rows written. A lookup that errors skips that IP, but when more than
+        MAX_FAILED_LOOKUPS of the batch fail (a broken reader, say, rather than one bad
+        value) nothing is written and RuntimeError is raised, so the batch counts as
+        failed and a queued batch stays queued.
+        """
+        # keyed by indicator so a value repeated in the batch is written once;
+        # ON CONFLICT can't touch the same row twice in one statement
+        rows = {}
+        looked_up = 0
+        failures: list[tuple[str, Exception]] = []
+        for ioc_id, raw_ip in indicators:
+            # address or CIDR network, with any port dropped
+            ip = ioc_inet("ip", raw_ip)
+            if not ip:
+                continue
+            looked_up += 1
+            try:
+                # shared, cached reader; see processors.geoip. addresses the database
+                # has no record for come back as None, not as an error
+                fields = self.database.lookup(ip)
+            except Exception as e:
+                failures.append((raw_ip, e))
+                continue
+            if fields is None:
+                continue  # private/reserved IPs won't be in the database
+            rows[ioc_id] = self.model(indicator_id=ioc_id, **fields)
+
+        if failures:
+            # one line per batch, not one per IP
+            raw_ip, e = failures[0]
+            logger.error("%s: %d/%d lookups failed, first on %s: %s",
+                         self.name, len(failures), looked_up, raw_ip, e)
+            if len(failures) > looked_up * MAX_FAILED_LOOKUPS:
+                raise RuntimeError(f"{self.name}: {len(failures)}/{looked_up} lookups failed: {e}")
+
+        if rows:
+            self.model.objects.bulk_create(
+                rows.values(),
+                update_conflicts=True,
+                unique_fields=["indicator"],
+                update_fields=self.update_fields,
+            )
+        return len(rows)
+
+    def enrich(self, ioc_ids: list[int]) -> int:
+        # callers like enrich_geo --chunk-size can pass more than batch_size
+        return sum(self._write(self.pending(ids).values_list("id", "ioc_value"))
+                   for ids in _batches(ioc_ids, self.batch_size))
+
+    def sweep(self) -> int:
+        """Walks the indicators in id order, batch_size at a time, each batch committed on its own."""
+        if not self.ready():
+            return 0
+        installed = self.database.installed_at()
+        count = 0
+        last_id = 0
+        while True:
+            batch = list(
+                self._needs(IndicatorOfCompromise.objects.filter(ioc_type__in=self.ioc_types, id__gt=last_id),
+                            installed)
+                .order_by("id")
+                .values_list("id", "ioc_value")[:self.batch_size]
+            )
+            if not batch:
+                break
+            count += self._write(batch)
+            last_id = batch[-1][0]
+        logger.info("%s sweep: %d indicators re-enriched", self.name, count)
+        return count
+
+
+def _run_one(enricher: Enricher, ids_by_type: dict[str, list[int]]) -> dict:
+    #runs on its own thread. Django gives each thread its own connection, so close
+    #it when done instead of leaving it open until the thread is collected
+    ids = [i for t in enricher.ioc_types for i in ids_by_type.get(t, ())]
+    started = time.perf_counter()
+    count = 0
+    error = None
+    try:
+        for batch in _batches(ids, enricher.batch_size):
+            count += enricher.enrich(batch)
+    except Exception as e:
+        # the exception logger automatically adds the full error trace
+        logger.exception("%s enricher failed", enricher.name)
+        error = str(e)[:120]
+    finally:
+        connection.close()
+
+    seconds = time.perf_counter() - started
+    logger.info("enrich %s: %d/%d indicators enriched in %.2fs", enricher.name, count, len(ids), seconds)
+    return {"count": count, "seconds": seconds, "error": error}
+
+
+def run_enrichers(ids_by_type: dict[str, list[int]]) -> dict[str, dict]:
+    """
+    Run every enabled, ready enricher over the indicator ids it accepts, all at
+    once, each on its own thread and database connection. Returns
+    {name: {"count", "seconds", "error"}}; a failing enricher reports its error
+    there instead of raising, and the others still finish.
+    """
+    enrichers = [e for e in enabled_enrichers()
+                 if e.ready() and any(ids_by_type.get(t) for t in e.ioc_types)]
+    if not enrichers:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=len(enrichers), thread_name_prefix="enrich") as pool:
+        futures = {e.name: pool.submit(_run_one, e, ids_by_type) for e in enrichers}
+    return {name: f.result() for name, f in futures.items()}
+
+
+def summarize(results: dict[str, dict]) -> str:
+    """One log-friendly line for run_enrichers() results, e.g. "geo 120 enriched, asn failed"."""
+    if not results:
+        return "nothing enriched"
+    return ", ".join(
+        f"{name} failed" if r["error"] else f"{name} {r['count']} enriched"
+        for name, r in results.items()
+    )
+
+
+def enqueue(ioc_ids: dict[tuple[str, str], int]) -> int:
+    """
+    The ENRICH_MODE = "queue" counterpart of run_enrichers(): put the indicators
+    that at least one enabled enricher still needs on enrichment_queue for
+    enrich_worker and wake it with a NOTIFY, instead of enriching them on the
+    ingest path. ioc_ids is the {(ioc_type, ioc_value): id} map
+    upsert_indicators returns. Returns how many were queued.
+    """
+    ids_by_type: dict[str, list[int]] = {}
+    for (ioc_type, _), ioc_id in ioc_ids.items():
+        ids_by_type.setdefault(ioc_type, []).append(ioc_id)
+
+    # each enricher's own anti-join, so an IP whose geo row is current is still
+    # queued when its asn row is missing or stale
+    needed: set[int] = set()
+    offered = 0
+    for enricher in enabled_enrichers():
+        ids = [i for t in enricher.ioc_types for i in ids_by_type.get(t, ())]
+        offered = max(offered, len(ids))
+        # a feed can hand over 100k+ ids; ask in batch_size slices, not one huge IN list
+        for batch in _batches(ids, enricher.batch_size):
+            needed.update(enricher.pending(batch).values_list("id", flat=True))
+    if not needed:
+        return 0
+
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(ENQUEUE_SQL, [sorted(needed)])
+        queued = cur.rowcount
+        if queued:
+            # delivered when this transaction commits, so the worker never wakes before the rows are visible
+            cur.execute("SELECT pg_notify(%s, '')", [ENRICH_CHANNEL])
+
+    logger.info("enqueue: %d/%d indicators queued for enrich_worker", queued, offered)
+    return queued
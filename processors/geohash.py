@@ -0,0 +1,126 @@
+"""
+Geohash encoding for the city-level heatmap.
+
+A geohash names a lat/lon cell with a base-32 string; every extra character
+splits the cell 32 ways, and a hash's prefixes are the larger cells holding it.
+GeoEnrichment stores the full-length hash of each indicator's coordinates, and
+triggers on geo_enrichments (migration 0016) count rows per prefix at each of
+PRECISIONS into geo_geohash_counts, so the heatmap reads a few thousand
+pre-aggregated buckets instead of every enriched row.
+"""
+
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(BASE32)}
+
+# length of the hash stored on GeoEnrichment (sub-metre cells)
+GEOHASH_LENGTH = 12
+
+# bucket lengths kept in geo_geohash_counts. migration 0016 builds its triggers from a copy
+# of this list, so changing it needs a new migration that replaces them
+#   2: ~1250 km, 3: ~156 km, 4: ~39 km, 5: ~4.9 km cells
+PRECISIONS = (2, 3, 4, 5)
+
+# (highest map zoom, precision) pairs: each zoom level is served the finest buckets
+# that still cover several pixels each, so the payload stays about the same size
+ZOOM_PRECISIONS = ((2.5, 2), (5.0, 3), (8.0, 4))
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_LENGTH) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = value = 0
+    even = True  # bits alternate longitude, latitude, starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = value << 1 | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = value << 1 | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def bounds(geohash: str) -> tuple[float, float, float, float]:
+    """(south, west, north, east) of the cell a geohash names."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for c in geohash:
+        value = _DECODE[c]
+        for shift in range(4, -1, -1):
+            bit = value >> shift & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lon_lo, lat_hi, lon_hi
+
+
+def center(geohash: str) -> tuple[float, float]:
+    """(latitude, longitude) of the middle of a geohash cell."""
+    south, west, north, east = bounds(geohash)
+    return (south + north) / 2, (west + east) / 2
+
+
+def _cell_size(precision: int) -> tuple[float, float]:
+    # (height, width) in degrees; longitude gets the extra bit when 5 * precision is odd
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def precision_for_zoom(zoom: float) -> int:
+    for max_zoom, precision in ZOOM_PRECISIONS:
+        if zoom < max_zoom:
+            return precision
+    return PRECISIONS[-1]
+
+
+def covering(south: float, west: float, north: float, east: float,
+             precision: int, max_cells: int = 64) -> list[str]:
+    """
+    Geohash prefixes that together cover a bounding box: the longest ones, up to
+    precision characters, that need at most max_cells cells. A box crossing the
+    antimeridian has west > east.
+    """
+    south, north = max(south, -90.0), min(north, 90.0)
+    if west > east:
+        spans = [(west, 180.0), (-180.0, east)]
+    else:
+        spans = [(max(west, -180.0), min(east, 180.0))]
+
+    def cells(p):
+        height, width = _cell_size(p)
+        rows = range(int((south + 90) // height), int((min(north, 89.999999) + 90) // height) + 1)
+        cols = [c for lo, hi in spans
+                for c in range(int((lo + 180) // width), int((min(hi, 179.999999) + 180) // width) + 1)]
+        return height, width, rows, cols
+
+    for p in range(precision, 0, -1):
+        height, width, rows, cols = cells(p)
+        if len(rows) * len(cols) <= max_cells or p == 1:
+            # encode each cell's centre to get its name
+            return sorted({encode(-90 + (r + 0.5) * height, -180 + (c + 0.5) * width, p)
+                           for r in rows for c in cols})
+    return []
@@ -0,0 +1,197 @@
+"""
+Process-wide lookups against the local DB-IP Lite databases: city (geo
+enrichment) and ASN (processors.asn).
+
+Each database is one MmdbDatabase: a geoip2 Reader opened in MODE_MMAP and
+shared by every thread in the process, so ingestion workers (and anything else
+that needs a lookup) never open the file themselves. The file is re-checked at
+most every GEOIP_RELOAD_CHECK_SECONDS; when download_geoip installs a new build
+the reader is reopened and the result cache is dropped.
+
+Results are kept in a bounded LRU cache keyed by the network block each record
+covers (the prefix the database returns with every lookup), not by address, so
+one lookup serves every IP in that block: whole /24s from one hosting provider
+cost a single read. Misses are cached the same way, by the largest block with
+no data, so private and reserved ranges are only looked up once as well.
+"""
+
+import datetime
+import ipaddress
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+import geoip2.database
+import geoip2.errors
+from django.conf import settings
+
+from processors import geohash
+
+logger = logging.getLogger(__name__)
+
+# how often lookup() stats the .mmdb file for a new build
+GEOIP_RELOAD_CHECK_SECONDS = 5.0
+
+
+def _file_stamp(path: Path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    # download_geoip swaps the file in with os.replace, which gives it a new inode
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def _block_key(net, prefix_len: int) -> tuple[int, int, int]:
+    return (net.version, prefix_len, int(net.network_address) >> (net.max_prefixlen - prefix_len))
+
+
+class MmdbDatabase:
+    """
+    One shared, cached .mmdb file. path_setting names the settings attribute
+    holding its path; read(reader, ip) does one lookup and returns
+    (fields dict, network block), raising AddressNotFoundError for a miss.
+    """
+
+    def __init__(self, path_setting: str, read):
+        self.path_setting = path_setting
+        self._read   = read
+        self._lock   = threading.Lock()
+        self._reader = None
+        self._stamp  = None       # (inode, mtime) of the file _reader was opened from
+        self._checked_at = 0.0
+        # (ip version, prefix length, network bits) -> fields, or None for a block without data
+        self._cache: OrderedDict[tuple[int, int, int], dict | None] = OrderedDict()
+        # how many cached blocks there are of each prefix length, per ip version;
+        # an address is matched by masking it to each of these lengths
+        self._prefix_lens: dict[int, Counter] = {4: Counter(), 6: Counter()}
+
+    @property
+    def path(self) -> Path | None:
+        value = getattr(settings, self.path_setting, None)
+        return Path(str(value)) if value else None
+
+    def _current_reader(self):
+        """The shared reader, reopened if the file has changed. None when there is no database."""
+        now = time.monotonic()
+        if self._reader is not None and now - self._checked_at < GEOIP_RELOAD_CHECK_SECONDS:
+            return self._reader
+
+        with self._lock:
+            self._checked_at = now
+            path  = self.path
+            stamp = _file_stamp(path) if path else None
+            if stamp == self._stamp:
+                return self._reader
+
+            # the old reader isn't closed here: lookups still running on it hold a reference,
+            # and the map is released once the last of them drops it
+            self._reader = geoip2.database.Reader(str(path), mode=geoip2.database.MODE_MMAP) if stamp else None
+            self._stamp  = stamp
+            self._clear_cache()
+            if self._reader is not None:
+                meta = self._reader.metadata()
+                logger.info("geoip: opened %s (build %s)", path,
+                            time.strftime("%Y-%m-%d", time.gmtime(meta.build_epoch)))
+            return self._reader
+
+    def installed_at(self) -> datetime.datetime | None:
+        """
+        When the database file in use was installed (its modification time), or None
+        without a database. Rows enriched before this came from an older build.
+        This is used rather than the build date in the file's metadata because rows
+        enriched between a build's release and its download still used the previous file.
+        """
+        if self._current_reader() is None:
+            return None
+        return datetime.datetime.fromtimestamp(self._stamp[1] / 1e9, tz=datetime.timezone.utc)
+
+    def _clear_cache(self) -> None:
+        self._cache.clear()
+        for lens in self._prefix_lens.values():
+            lens.clear()
+
+    def _cached(self, net):
+        """(True, value) for the cached block holding all of net, or (False, None). Call with _lock held."""
+        for prefix_len in self._prefix_lens[net.version]:
+            if prefix_len > net.prefixlen:
+                continue  # a smaller block than net can't answer for all of it
+            key = _block_key(net, prefix_len)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return True, self._cache[key]
+        return False, None
+
+    def _store(self, block, fields) -> None:
+        """Cache fields for a whole network block, evicting the least recently used. Call with _lock held."""
+        key = _block_key(block, block.prefixlen)
+        if key not in self._cache:
+            self._prefix_lens[block.version][block.prefixlen] += 1
+        self._cache[key] = fields
+        self._cache.move_to_end(key)
+        while len(self._cache) > settings.GEOIP_CACHE_SIZE:
+            (version, prefix_len, _), _ = self._cache.popitem(last=False)
+            lens = self._prefix_lens[version]
+            lens[prefix_len] -= 1
+            if not lens[prefix_len]:
+                del lens[prefix_len]
+
+    def lookup(self, value: str) -> dict | None:
+        """
+        Fields for an IP address or a CIDR network ("10.0.0.0/8"), or None when
+        the database has no record for it (private and reserved ranges) or there
+        is no database. A network is looked up by its first address, and is
+        answered from the cache when one cached block covers all of it.
+        The returned dict is shared through the cache; don't modify it.
+        """
+        reader = self._current_reader()
+        if reader is None:
+            return None
+
+        net = ipaddress.ip_network(value, strict=False)
+        with self._lock:
+            hit, fields = self._cached(net)
+        if hit:
+            return fields
+
+        try:
+            fields, block = self._read(reader, str(net.network_address))
+        except geoip2.errors.AddressNotFoundError as e:
+            fields, block = None, e.network
+
+        with self._lock:
+            # a reload while this lookup ran would have emptied the cache; don't refill it with the old build
+            if reader is self._reader:
+                # without a block from the database, cache just this one address
+                self._store(block or ipaddress.ip_network(net.network_address), fields)
+        return fields
+
+
+def _read_city(reader, ip: str):
+    result = reader.city(ip)
+    lat, lon = result.location.latitude, result.location.longitude
+    return {
+        "country":        result.country.name or "",
+        "country_code":   result.country.iso_code or "",
+        "continent_code": result.continent.code or "",
+        "city":           result.city.name or "",
+        "latitude":       lat,
+        "longitude":      lon,
+        # hashed once per cached block, not per IP
+        "geohash":        geohash.encode(lat, lon) if lat is not None and lon is not None else "",
+    }, result.traits.network
+
+
+def _read_asn(reader, ip: str):
+    result = reader.asn(ip)
+    return {
+        "asn":     result.autonomous_system_number,
+        "as_org":  result.autonomous_system_organization or "",
+        "network": str(result.network) if result.network else None,
+    }, result.network
+
+
+city = MmdbDatabase("GEOIP_PATH", _read_city)
+asn  = MmdbDatabase("GEOIP_ASN_PATH", _read_asn)
@@ -8,6 +8,7 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from ingestion.type_map import TYPE_MAP
+from processors.record import IndicatorRecord
 
 logger = logging.getLogger(__name__)
 
@@ -143,8 +144,8 @@ def _clean_labels(raw_labels: list, ioc_type: str) -> list:
     return out
 
 
-def normalize_one(raw: dict) -> Optional[dict]:
-    # takes a raw dict from any adapter and returns a clean canonical dict
+def normalize_one(raw) -> Optional[IndicatorRecord]:
+    # takes a raw dict or IndicatorRecord from any adapter and returns a clean canonical record
     # returns None if the record can't be resolved (empty value, unknown type, too long)
     raw_value = str(raw.get("ioc_value") or "").strip()
     if not raw_value:
@@ -167,17 +168,17 @@ def normalize_one(raw: dict) -> Optional[dict]:
         logger.warning("normalize: value too long (%d chars), skipping: %.80s…", len(ioc_value), ioc_value)
         return None
 
-    return {
-        "ioc_type":   ioc_type,
-        "ioc_value":  ioc_value,
-        "confidence": _safe_confidence(raw.get("confidence")),
-        "labels":     _clean_labels(raw.get("labels") or [], ioc_type),
-        "first_seen": _parse_ts(raw.get("first_seen")),
-        "last_seen":  _parse_ts(raw.get("last_seen")),
-    }
+    return IndicatorRecord(
+        ioc_type   = ioc_type,
+        ioc_value  = ioc_value,
+        confidence = _safe_confidence(raw.get("confidence")),
+        labels     = _clean_labels(raw.get("labels") or [], ioc_type),
+        first_seen = _parse_ts(raw.get("first_seen")),
+        last_seen  = _parse_ts(raw.get("last_seen")),
+    )
 
 
-def normalize_batch(records: list[dict], source_name: str) -> list[dict]:
+def normalize_batch(records: list, source_name: str) -> list[IndicatorRecord]:
     out, skipped = [], 0
     for r in records:
         try:
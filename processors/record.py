@@ -0,0 +1,128 @@
+"""
+Compact record type shared by the ingest pipeline stages.
+
+Adapters, normalize, dedup, merge, and the loader all pass indicators around in
+bulk, so the per-record overhead adds up fast on multi-million line feeds. A
+slotted object has no per-instance __dict__, which makes it several times
+smaller than the equivalent six-key dict.
+
+IndicatorRecord also answers the dict-style calls the stages already make
+(r["ioc_type"], r.get("labels"), r["labels"] = ...), so code written against
+plain dicts keeps working and adapters may return either form. Convert with
+to_dict() only where a record leaves the pipeline.
+"""
+
+import hashlib
+import ipaddress
+
+# bytes of sha256 kept for ioc_key; 128 bits makes a collision practically impossible
+IOC_KEY_BYTES = 16
+
+# hex length of each hash type stored in ioc_hash
+HASH_LENGTHS = {"md5": 32, "sha1": 40, "sha256": 64, "sha512": 128}
+
+
+def ioc_key(ioc_type: str, ioc_value: str) -> bytes:
+    """Fixed-width digest of type + value, the indicator's conflict and lookup key."""
+    return hashlib.sha256(f"{ioc_type}:{ioc_value}".encode("utf-8")).digest()[:IOC_KEY_BYTES]
+
+
+def ioc_hash(ioc_type: str, ioc_value: str) -> bytes | None:
+    """Raw digest bytes for md5/sha1/sha256/sha512 indicators, half the size of the hex."""
+    if len(ioc_value) != HASH_LENGTHS.get(ioc_type):
+        return None
+    try:
+        return bytes.fromhex(ioc_value)
+    except ValueError:
+        return None
+
+
+def ioc_inet(ioc_type: str, ioc_value: str) -> str | None:
+    """Address or network of an ip indicator in Postgres inet form, e.g. "10.0.0.0/8".
+    Ports and paths after the address are dropped, the same way normalize reads them."""
+    if ioc_type != "ip":
+        return None
+    value = ioc_value.strip()
+    # an IPv6 zone ("fe80::1%eth0") only means something on the host that saw it,
+    # and inet rejects it; keep the address and any prefix length after it
+    if "%" in value:
+        address, _, rest = value.partition("%")
+        value = address + ("/" + rest.split("/", 1)[1] if "/" in rest else "")
+    if "/" in value:
+        try:
+            return str(ipaddress.ip_network(value, strict=False))
+        except ValueError:
+            value = value.split("/", 1)[0]
+    if value.count(":") == 1:
+        value = value.split(":")[0]
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
+
+class IndicatorRecord:
+
+    __slots__ = ("ioc_type", "ioc_value", "confidence", "labels", "first_seen", "last_seen", "sources")
+
+    def __init__(self, ioc_type="", ioc_value="", confidence=None, labels=None,
+                 first_seen=None, last_seen=None, sources=None):
+        self.ioc_type   = ioc_type
+        self.ioc_value  = ioc_value
+        self.confidence = confidence
+        self.labels     = labels if labels is not None else []
+        self.first_seen = first_seen
+        self.last_seen  = last_seen
+        # None means "not merged yet"; the loader falls back to the source being ingested
+        self.sources    = sources
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "IndicatorRecord":
+        return cls(**{k: d.get(k) for k in cls.__slots__})
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def copy(self) -> "IndicatorRecord":
+        return IndicatorRecord(*(getattr(self, k) for k in self.__slots__))
+
+    # dict-style access, kept so stages written against dicts work unchanged
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return self.__slots__
+
+    # pickle as a plain tuple of field values
+
+    def __reduce__(self):
+        return (IndicatorRecord, tuple(getattr(self, k) for k in self.__slots__))
+
+    def __eq__(self, other):
+        if not isinstance(other, IndicatorRecord):
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self):
+        return f"IndicatorRecord({self.ioc_type}:{self.ioc_value})"
+
+
+def as_record(r) -> IndicatorRecord:
+    """Accept either a record or a legacy dict from an adapter."""
+    return r if isinstance(r, IndicatorRecord) else IndicatorRecord.from_dict(r)
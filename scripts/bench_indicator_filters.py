@@ -0,0 +1,98 @@
+"""
+Time the indicator page filters and the analytics source breakdown against the
+configured database.
+    - Run `python scripts/bench_indicator_filters.py --seed 300000` to time them over
+      synthetic indicators
+    - Run `python scripts/bench_indicator_filters.py` to time them over the data already there
+
+Everything runs in one transaction that is rolled back at the end, so the
+synthetic "bench-feed-*" rows are never committed, whichever database
+DJANGO_SETTINGS_MODULE points at.
+
+Each query is run --repeat times and the best time is reported, along with the
+top plan node Postgres picked, so index use is visible at a glance.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cti.settings")
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+
+from ingestion.loaders.upsert import upsert_indicators  # noqa: E402
+from ingestion.models import IndicatorOfCompromise, Label  # noqa: E402
+from processors.record import IndicatorRecord  # noqa: E402
+
+SOURCES = [f"bench-feed-{i}" for i in range(12)]
+LABELS  = [f"family-{i}" for i in range(400)]
+
+
+def _seed(n: int) -> None:
+    rng = random.Random(42)
+    for source in SOURCES:
+        records = [
+            IndicatorRecord(
+                ioc_type="ip",
+                ioc_value=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+                labels=rng.sample(LABELS, 2),
+            )
+            for i in rng.sample(range(n), n // 4)
+        ]
+        # one worker: parallel workers commit on their own connections, outside the rollback
+        upsert_indicators(records, source_name=source, workers=1)
+
+
+def _plan_top(sql: str, params) -> str:
+    with connection.cursor() as cur:
+        cur.execute("EXPLAIN " + sql, params)
+        return cur.fetchall()[0][0].split("  (")[0].strip()
+
+
+def _time(name: str, qs, repeat: int) -> None:
+    sql, params = qs.query.sql_with_params()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        qs.count()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<28} {best * 1000:9.1f} ms   {_plan_top(sql, params)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed", type=int, default=0, help="Insert this many synthetic IP indicators first.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        try:
+            _run(args)
+        finally:
+            transaction.set_rollback(True)
+
+
+def _run(args) -> None:
+    if args.seed:
+        _seed(args.seed)
+    with connection.cursor() as cur:
+        cur.execute("ANALYZE indicators_of_compromise")
+
+    iocs = IndicatorOfCompromise.objects
+    label_id = dict(Label.objects.filter(name__in=LABELS[7:9]).values_list("name", "id"))
+    print(f"{iocs.count():,} indicators")
+    _time("source filter", iocs.filter(sources__contains=[SOURCES[3]]), args.repeat)
+    _time("label filter", iocs.filter(label_ids__contains=[label_id[LABELS[7]]]), args.repeat)
+    _time("two label filters", iocs.filter(label_ids__contains=sorted(label_id.values())), args.repeat)
+    _time("source + label", iocs.filter(sources__contains=[SOURCES[3]], label_ids__contains=[label_id[LABELS[7]]]), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
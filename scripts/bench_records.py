@@ -0,0 +1,73 @@
+"""
+Benchmark the in-memory side of the ingest pipeline (normalize + dedup) with
+plain dict records versus the slotted IndicatorRecord.
+
+Each mode runs in its own subprocess so the peak RSS numbers don't bleed into
+each other. No database is needed.
+    - Run `python scripts/bench_records.py` for the default 5M-record feed
+    - Run `python scripts/bench_records.py --records 1000000` for a quicker pass
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _synthetic_feed(n: int, as_dict: bool):
+    # a blocklist-shaped feed: IPv4 values with ~10% repeats so dedup has work to do
+    from processors.record import IndicatorRecord
+
+    for i in range(n):
+        j = i % (n - n // 10 or 1)
+        value = f"{10 + (j >> 24) % 200}.{(j >> 16) & 255}.{(j >> 8) & 255}.{j & 255}"
+        if as_dict:
+            yield {"ioc_type": "ip", "ioc_value": value, "labels": ["scanner"],
+                   "confidence": 50, "first_seen": None, "last_seen": None}
+        else:
+            yield IndicatorRecord(ioc_type="ip", ioc_value=value, labels=["scanner"], confidence=50)
+
+
+def _run_mode(mode: str, n: int) -> None:
+    from processors.dedup import dedup
+    from processors.normalize import normalize_one
+
+    as_dict = mode == "dict"
+    start = time.perf_counter()
+    raw = list(_synthetic_feed(n, as_dict))
+    fetched = time.perf_counter()
+    if as_dict:
+        # the old pipeline shape: every stage holds six-key dicts. the extra to_dict()
+        # call is charged to this mode, so treat its throughput as a lower bound
+        normalized = [n.to_dict() for n in map(normalize_one, raw) if n is not None]
+    else:
+        normalized = [n for n in map(normalize_one, raw) if n is not None]
+    out = dedup(normalized)
+    done = time.perf_counter()
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:>6}: {len(out):,} unique / {n:,} records | "
+          f"build {fetched - start:5.1f}s | normalize+dedup {done - fetched:5.1f}s "
+          f"({n / (done - fetched):,.0f} rec/s) | peak RSS {peak_mb:,.0f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=5_000_000)
+    parser.add_argument("--mode", choices=["dict", "record"])
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_mode(args.mode, args.records)
+        return
+
+    for mode in ("dict", "record"):
+        subprocess.run([sys.executable, __file__, "--mode", mode, "--records", str(args.records)], check=True)
+
+
+if __name__ == "__main__":
+    main()